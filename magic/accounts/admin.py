@@ -1,3 +1,108 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .models import CohortSummary, FoodFrequency, Job, Meal, UserProfile
 
 # Register your models here.
+
+# 絞り込みのない一覧でこれより多い行があるときは、COUNT(*) の代わりに統計情報の推定値を使う
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+def estimated_row_count(model, using='default'):
+    # データベースの統計情報からテーブルの行数の推定値を取得する（取得できないときは None）
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'mysql':
+        sql = 'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s'
+    elif connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    # 大きなテーブルの一覧で、ページ数の計算のための COUNT(*) を避けるページネーター
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+@admin.register(Meal)
+class MealAdmin(admin.ModelAdmin):
+    list_display = ['date', 'eaten_at', 'user', 'meal_type', 'food_name', 'calories']
+    list_filter = ['meal_type']
+    list_select_related = ['user']
+    search_fields = ['food_name', 'user__username']
+    date_hierarchy = 'date'
+    raw_id_fields = ['user']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(UserProfile)
+class UserProfileAdmin(admin.ModelAdmin):
+    list_display = ['user', 'age', 'gender', 'target_calories', 'target_calories_override', 'updated_at']
+    list_filter = ['gender']
+    list_select_related = ['user']
+    search_fields = ['user__username']
+    date_hierarchy = 'created_at'
+    raw_id_fields = ['user']
+    readonly_fields = ['target_calories']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+# よく食べる食品の候補は食事の追加時に集計するので、管理画面では確認と削除（候補から外す）だけにする
+@admin.register(FoodFrequency)
+class FoodFrequencyAdmin(admin.ModelAdmin):
+    list_display = ['user', 'food_name', 'meal_type', 'calories', 'count', 'last_eaten', 'score']
+    list_select_related = ['user']
+    search_fields = ['food_name', 'user__username']
+    raw_id_fields = ['user']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# コホート集計は build_cohort_summary コマンドで作成するので、管理画面では閲覧だけにする
+@admin.register(CohortSummary)
+class CohortSummaryAdmin(admin.ModelAdmin):
+    list_display = [
+        'period_end', 'age_band', 'gender', 'users', 'logged_days',
+        'average_daily_calories', 'over_target_days', 'over_target_share', 'period_start', 'built_at',
+    ]
+    list_filter = ['period_end', 'age_band', 'gender']
+    date_hierarchy = 'period_end'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# バックグラウンド処理は run_worker コマンドが実行するので、管理画面では状態の確認だけにする
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['pk', 'name', 'status', 'attempts', 'max_attempts', 'user', 'run_after', 'locked_by', 'finished_at']
+    list_filter = ['status', 'name']
+    list_select_related = ['user']
+    readonly_fields = [field.name for field in Job._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+import numpy as np
+
+from .models import Meal
+
+# 食事の傾向分析（移動平均・食事の種類別・曜日×時間帯・摂取時間の分布）
+# 期間内の食事を values_list で1回だけ読み込み、列ごとの NumPy 配列にしてから集計する。
+# numpy が必要なので、ビューからは使うときに import する。
+TREND_PERIODS = {'30d': 30, '90d': 90, '1y': 365, '10y': 3653}
+MOVING_AVERAGE_WINDOWS = (7, 30)
+EATEN_AT_BIN_MINUTES = 30
+MEAL_TYPE_CODES = [meal_type for meal_type, _ in Meal.MEAL_TYPES]
+
+
+def load_meal_columns(user, start, end):
+    # 日付（start からの日数）・摂取時刻（分）・食事の種類（番号）・カロリーの4列にする
+    rows = (
+        Meal.objects.filter(user=user, date__range=(start, end))
+        .order_by()
+        .values_list('date', 'eaten_at', 'meal_type', 'calories')
+    )
+    dates, times, meal_types, calories = zip(*rows) if rows else ((), (), (), ())
+    start_ordinal = start.toordinal()
+    type_codes = {meal_type: code for code, meal_type in enumerate(MEAL_TYPE_CODES)}
+    return {
+        'day': np.fromiter((day.toordinal() - start_ordinal for day in dates), dtype=np.int32, count=len(dates)),
+        'minute': np.fromiter((time.hour * 60 + time.minute for time in times), dtype=np.int32, count=len(times)),
+        'meal_type': np.fromiter((type_codes[meal_type] for meal_type in meal_types), dtype=np.int32, count=len(meal_types)),
+        'calories': np.asarray(calories, dtype=np.float64),
+    }
+
+
+def rolling_mean(values, present, window):
+    # 記録のある日だけを数えた window 日間の平均（累積和の差で計算する）。記録がない区間は NaN
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    counts = np.concatenate(([0], np.cumsum(present)))
+    upper = np.arange(1, len(values) + 1)
+    lower = np.maximum(upper - window, 0)
+    window_counts = counts[upper] - counts[lower]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(window_counts > 0, (sums[upper] - sums[lower]) / window_counts, np.nan)
+
+
+def _to_list(values, digits=1):
+    return [None if np.isnan(value) else value for value in np.round(values, digits).tolist()]
+
+
+def compute_trends(columns, start, end):
+    days = (end - start).days + 1
+    day = columns['day']
+    calories = columns['calories']
+    meal_type = columns['meal_type']
+    type_count = len(MEAL_TYPE_CODES)
+
+    # 日ごとの合計と記録のある日
+    daily = np.bincount(day, weights=calories, minlength=days)
+    logged = np.bincount(day, minlength=days) > 0
+    logged_days = int(logged.sum())
+
+    # 食事の種類別の合計・記録のある日1日あたりの平均・割合
+    type_totals = np.bincount(meal_type, weights=calories, minlength=type_count)
+    grand_total = type_totals.sum()
+    by_meal_type = {
+        code: {
+            'total': int(type_totals[index]),
+            'average_per_day': round(float(type_totals[index]) / logged_days, 1) if logged_days else None,
+            'share': round(float(type_totals[index] / grand_total), 3) if grand_total else None,
+        }
+        for index, code in enumerate(MEAL_TYPE_CODES)
+    }
+
+    # 曜日 (月曜=0) × 時間帯ごとの、その曜日1日あたりの平均カロリー
+    first_weekday = start.weekday()
+    weekday = (day + first_weekday) % 7
+    hour = columns['minute'] // 60
+    heatmap = np.bincount(weekday * 24 + hour, weights=calories, minlength=7 * 24).reshape(7, 24)
+    weekday_days = np.bincount((np.arange(days) + first_weekday) % 7, minlength=7)
+    heatmap = heatmap / np.maximum(weekday_days, 1)[:, None]
+
+    # 摂取時刻の分布（食事の種類別の件数）
+    bins = 24 * 60 // EATEN_AT_BIN_MINUTES
+    eaten_at = np.bincount(
+        meal_type * bins + columns['minute'] // EATEN_AT_BIN_MINUTES, minlength=type_count * bins
+    ).reshape(type_count, bins)
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'daily': daily.astype(int).tolist(),
+        'moving_averages': {
+            str(window): _to_list(rolling_mean(daily, logged, window)) for window in MOVING_AVERAGE_WINDOWS
+        },
+        'logged_days': logged_days,
+        'average_per_logged_day': round(float(daily.sum()) / logged_days, 1) if logged_days else None,
+        'by_meal_type': by_meal_type,
+        'weekday_hour': np.round(heatmap, 1).tolist(),
+        'eaten_at': {
+            'bin_minutes': EATEN_AT_BIN_MINUTES,
+            'counts': {code: eaten_at[index].tolist() for index, code in enumerate(MEAL_TYPE_CODES)},
+        },
+    }
+
+
+def user_trends(user, period, today):
+    end = today
+    start = end - timedelta(days=TREND_PERIODS[period] - 1)
+    return compute_trends(load_meal_columns(user, start, end), start, end)
@@ -5,3 +5,4 @@ class AccountsConfig(AppConfig):
 
     def ready(self):
         import accounts.signals
+        import accounts.tasks
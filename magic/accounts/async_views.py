@@ -0,0 +1,124 @@
+import calendar
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.utils.dateparse import parse_date
+
+from . import views
+from .caches import adashboard_version, aget_calendar_year
+from .forms import MealForm
+from .models import DailyCalorieTotal, Meal
+from .routers import read_from_replica
+
+# ASGI（uvicorn・daphne など）で動かすときの、読み込み中心のビューの非同期版
+# データベースは非同期 ORM で読み込み、1リクエストごとにスレッドを占有しないようにする。
+# 計算やレスポンスの組み立ては views.py の同期版と共通の関数を使う。
+
+
+async def _aget_user(request):
+    # Django 4.2 の request.user は同期処理（セッション・ユーザーの読み込み）なのでスレッドで評価する
+    def get_user():
+        user = request.user
+        return user if user.is_authenticated else None
+
+    return await sync_to_async(get_user)()
+
+
+# ホーム画面
+@read_from_replica
+async def home(request):
+    user_info = await _aget_user(request)
+    if user_info is None:
+        return redirect_to_login(request.get_full_path())
+    context = views._home_context(user_info, await adashboard_version(user_info.pk))
+    # キャッシュのない断片はテンプレートの中でデータベースを読むので、描画はスレッドで行う
+    return await sync_to_async(render)(request, 'home.html', context)
+
+
+# 日付を選んだ後の食事一覧（GET のみ非同期。登録の POST は同期版に任せる）
+@read_from_replica
+async def enter_meal_data(request):
+    if request.method != 'GET':
+        return await sync_to_async(views.enter_meal_data)(request)
+    user = await _aget_user(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+
+    selected_date_str = request.GET.get('selected_date', None)
+    selected_date = parse_date(selected_date_str) if selected_date_str else None
+    form = MealForm(initial={'date': selected_date})
+
+    meals = []
+    total_calories = 0
+    if selected_date:
+        meals = [meal async for meal in Meal.objects.filter(date=selected_date, user=user)]
+        # 合計カロリーは日別集計から取得
+        total_calories = await DailyCalorieTotal.objects.atotal_for(user, selected_date)
+
+    # 食事は読み込み済みなので、描画中にデータベースへのアクセスは発生しない
+    return render(request, 'enter_meal_data.html', {
+        'selected_date': selected_date,
+        'form': form,
+        'meals': meals,
+        'total_calories': total_calories
+    })
+
+
+# カレンダーAPI（年単位）
+@read_from_replica
+async def calories_by_year(request, year):
+    user = await _aget_user(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    if not date.min.year <= year <= date.max.year:
+        return views._year_out_of_range()
+    entry = await _acalendar_year(user, year)
+    return views._conditional_json(request, entry['etag'], entry['last_modified'], lambda: views._year_body(entry))
+
+
+# 期間指定のカレンダーAPI
+@read_from_replica
+async def calories_by_range(request):
+    user = await _aget_user(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    start = parse_date(request.GET.get('from') or '')
+    end = parse_date(request.GET.get('to') or '')
+    if start is None or end is None or start > end:
+        return JsonResponse({'error': 'from と to を YYYY-MM-DD 形式で指定してください。'}, status=400)
+    if (end - start).days >= settings.CALENDAR_RANGE_MAX_DAYS:
+        return JsonResponse({'error': f'期間は {settings.CALENDAR_RANGE_MAX_DAYS} 日以内で指定してください。'}, status=400)
+    return await _acalories_columnar(request, user, start, end)
+
+
+# 月単位のカレンダーAPI
+@read_from_replica
+async def calories_by_month(request, year, month):
+    user = await _aget_user(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    if not date.min.year <= year <= date.max.year:
+        return views._year_out_of_range()
+    if not 1 <= month <= 12:
+        return JsonResponse({'error': '月は 1〜12 で指定してください。'}, status=400)
+    start = date(year, month, 1)
+    end = date(year, month, calendar.monthrange(year, month)[1])
+    return await _acalories_columnar(request, user, start, end)
+
+
+async def _acalories_columnar(request, user, start, end):
+    entries = [await _acalendar_year(user, year) for year in range(start.year, end.year + 1)]
+    return views._columnar_response(request, start, end, entries)
+
+
+async def _acalendar_year(user, year):
+    async def build():
+        rows = [row async for row in views._calendar_year_rows(user, year)]
+        # user.profile は認証バックエンド (ProfileModelBackend) で一緒に読み込み済み
+        return views._calendar_year_data(user, year, rows)
+
+    return await aget_calendar_year(user.pk, year, build)
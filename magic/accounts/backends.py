@@ -0,0 +1,14 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+# ログイン中のユーザーをプロフィールと一緒に1回のクエリで読み込む認証バックエンド
+# （request.user.profile.target_calories を参照してもクエリが増えない）
+class ProfileModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related('profile').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,72 @@
+import datetime
+import math
+import random
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from .models import DailyCalorieTotal, FoodFrequency, Meal, UserProfile
+
+# ベンチマーク用の合成データ
+FOOD_NAMES = ['ごはん', 'みそ汁', 'カレー', 'ラーメン', 'サラダ', '焼き魚', 'パン', 'パスタ', '牛丼', 'うどん']
+MEAL_HOURS = {'breakfast': (6, 9), 'lunch': (11, 14), 'dinner': (18, 21)}
+BENCH_PASSWORD = 'bench-password'
+
+
+@contextmanager
+def bench_database(verbosity=0):
+    # 本番データに触れないよう、テスト用データベースを作成してその中で計測する
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def seed_meals(users, meals_per_user, seed=0, start=datetime.date(2015, 1, 1)):
+    # users 人に meals_per_user 件ずつ食事データを作成する（seed が同じなら同じデータになる）
+    rng = random.Random(seed)
+    meal_types = list(MEAL_HOURS)
+    created_users = []
+    for number in range(users):
+        user = User.objects.create_user(f'bench{number}', password=BENCH_PASSWORD)
+        profile = UserProfile.objects.get(user=user)
+        profile.age = rng.randint(18, 80)
+        profile.gender = rng.choice(['M', 'F'])
+        profile.save()
+        created_users.append(user)
+
+        meals = []
+        day = start
+        while len(meals) < meals_per_user:
+            for meal_type in meal_types:
+                if len(meals) >= meals_per_user:
+                    break
+                hour = rng.randint(*MEAL_HOURS[meal_type])
+                meals.append(Meal(
+                    user=user,
+                    food_name=rng.choice(FOOD_NAMES),
+                    calories=rng.randint(200, 1200),
+                    date=day,
+                    eaten_at=datetime.time(hour, rng.choice([0, 15, 30, 45])),
+                    meal_type=meal_type,
+                ))
+            day += datetime.timedelta(days=1)
+        # bulk_create はシグナルを送らないので、日別集計とよく食べる食品はまとめて作る
+        Meal.objects.bulk_create(meals, batch_size=1000)
+        DailyCalorieTotal.objects.rebuild(user.pk)
+        FoodFrequency.objects.record(user.pk, meals)
+    return created_users
+
+
+def percentile(values, percent):
+    # 最近傍順位法によるパーセンタイル
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# カレンダーAPI (calories_by_year) のユーザー・年ごとのキャッシュ
+# 食事の追加・更新・削除では該当する年のバージョン、プロフィール変更（目標カロリーが変わる）では
+# そのユーザーの世代番号を更新して無効化する。キーを消すのではなくキーを変えるので、
+# コミット前のデータで作った結果を無効化の後に書き込まれても、古いキーに残るだけで読まれない。
+
+
+def _calendar_generation_key(user_id):
+    return f'accounts:calendar:{user_id}:generation'
+
+
+def _calendar_generation(user_id):
+    # 世代番号が消えた場合も古いキャッシュを参照しないよう、現在時刻から作り直す
+    return cache.get_or_set(_calendar_generation_key(user_id), time.time_ns, None)
+
+
+def _calendar_year_version_key(user_id, year):
+    return f'accounts:calendar:{user_id}:{year}:version'
+
+
+def _calendar_key(user_id, year, generation=None, version=None):
+    if generation is None:
+        generation = _calendar_generation(user_id)
+    if version is None:
+        version = cache.get_or_set(_calendar_year_version_key(user_id, year), time.time_ns, None)
+    return f'accounts:calendar:{user_id}:{generation}:{year}:{version}'
+
+
+def _calendar_entry(data):
+    return {
+        'data': data,
+        'etag': hashlib.md5(json.dumps(data, sort_keys=True).encode()).hexdigest(),
+        'last_modified': int(time.time()),
+    }
+
+
+def get_calendar_year(user_id, year, build):
+    # build() が返す1年分のデータ（JSON 化できる値）を ETag・更新時刻と一緒にキャッシュする
+    key = _calendar_key(user_id, year)
+    entry = cache.get(key)
+    if entry is None:
+        entry = _calendar_entry(build())
+        cache.set(key, entry, settings.CALENDAR_CACHE_TIMEOUT)
+    return entry
+
+
+async def aget_calendar_year(user_id, year, abuild):
+    # get_calendar_year の非同期版（abuild はコルーチン関数）
+    generation = await cache.aget_or_set(_calendar_generation_key(user_id), time.time_ns, None)
+    version = await cache.aget_or_set(_calendar_year_version_key(user_id, year), time.time_ns, None)
+    key = _calendar_key(user_id, year, generation, version)
+    entry = await cache.aget(key)
+    if entry is None:
+        entry = _calendar_entry(await abuild())
+        await cache.aset(key, entry, settings.CALENDAR_CACHE_TIMEOUT)
+    return entry
+
+
+def invalidate_calendar_year(user_id, year):
+    cache.set(_calendar_year_version_key(user_id, year), time.time_ns(), None)
+
+
+def invalidate_calendar(user_id):
+    cache.set(_calendar_generation_key(user_id), time.time_ns(), None)
+
+
+# ホーム画面のダッシュボード（テンプレートの {% cache %} 断片）のユーザーごとのバージョン
+# 食事の書き込みや目標カロリーの変更で更新し、古い断片を参照しないようにする。
+
+def _dashboard_version_key(user_id):
+    return f'accounts:dashboard:{user_id}:version'
+
+
+def dashboard_version(user_id):
+    return cache.get_or_set(_dashboard_version_key(user_id), time.time_ns, None)
+
+
+async def adashboard_version(user_id):
+    return await cache.aget_or_set(_dashboard_version_key(user_id), time.time_ns, None)
+
+
+# 傾向分析 (accounts.analytics) の結果のキャッシュ
+# ダッシュボードと同じバージョンを使い、食事の書き込みで無効になるようにする。
+# 期間の終わりは今日なので、日付もキーに含める。
+
+def get_trends(user_id, period, day, build):
+    # build() が返す JSON 文字列をそのままキャッシュする
+    key = f'accounts:trends:{user_id}:{dashboard_version(user_id)}:{period}:{day.isoformat()}'
+    body = cache.get(key)
+    if body is None:
+        body = build()
+        cache.set(key, body, settings.TRENDS_CACHE_TIMEOUT)
+    return body
+
+
+def bump_dashboard_version(user_id):
+    cache.set(_dashboard_version_key(user_id), time.time_ns(), None)
+
+
+# 食品検索の索引 (accounts.food_search) のバージョン
+# 索引は各プロセスのメモリに持つので、食品カタログの変更は共有キャッシュのバージョンで知らせる。
+
+def _food_index_version_key():
+    return 'accounts:food_index:version'
+
+
+def food_index_version():
+    return cache.get_or_set(_food_index_version_key(), time.time_ns, None)
+
+
+def bump_food_index_version():
+    cache.set(_food_index_version_key(), time.time_ns(), None)
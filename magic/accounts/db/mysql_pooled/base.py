@@ -0,0 +1,54 @@
+from django.db.backends.mysql.base import DatabaseWrapper as MySQLDatabaseWrapper
+
+from accounts.db.pool import get_pool
+
+# 接続プールを使う MySQL バックエンド（ENGINE: 'accounts.db.mysql_pooled'）
+# Django の接続を閉じるタイミング (CONN_MAX_AGE) はそのままに、実際の接続はプールに戻して使い回すので、
+# スレッドが入れ替わっても TCP 接続・認証・接続時の SET 文をやり直さずに済む。
+# OPTIONS の pool_size / pool_max_lifetime / pool_ping_after でプールを設定する（MySQLdb には渡さない）
+POOL_OPTIONS = {
+    'pool_size': 5,
+    'pool_max_lifetime': 60 * 60,
+    'pool_ping_after': 30,
+}
+
+
+class DatabaseWrapper(MySQLDatabaseWrapper):
+    pool_reused = False
+
+    def get_pool(self):
+        options = self.settings_dict['OPTIONS']
+        return get_pool(
+            self.alias,
+            max_size=options.get('pool_size', POOL_OPTIONS['pool_size']),
+            max_lifetime=options.get('pool_max_lifetime', POOL_OPTIONS['pool_max_lifetime']),
+            ping_after=options.get('pool_ping_after', POOL_OPTIONS['pool_ping_after']),
+        )
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        for key in POOL_OPTIONS:
+            params.pop(key, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection, self.pool_reused = self.get_pool().acquire(
+            lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+            lambda connection: connection.ping(),
+        )
+        return connection
+
+    def init_connection_state(self):
+        # 使い回した接続は SQL_AUTO_IS_NULL や分離レベルの設定が済んでいる
+        if not self.pool_reused:
+            super().init_connection_state()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # トランザクションの途中・エラーの後・autocommit を戻していない接続は使い回さない
+        if self.in_atomic_block or self.errors_occurred or self.autocommit != self.settings_dict['AUTOCOMMIT']:
+            with self.wrap_database_errors:
+                self.get_pool().discard(self.connection)
+            return
+        self.get_pool().release(self.connection)
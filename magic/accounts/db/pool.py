@@ -0,0 +1,97 @@
+import threading
+import time
+
+# プロセス内のデータベース接続プール（accounts.db.mysql_pooled で使う）
+# リクエストの終わりに閉じた接続を捨てずにここへ戻し、次のリクエストで使い回す。
+# 接続は新しく戻したものから使い、古くなったもの・しばらく使っていないもので応答しないものは作り直す。
+
+
+class _Entry:
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.released_at = self.created_at
+
+
+class ConnectionPool:
+    def __init__(self, max_size, max_lifetime, ping_after):
+        self.max_size = max_size  # 待機させておく接続の上限（使用中の接続は数えない）
+        self.max_lifetime = max_lifetime  # これより古い接続は使わずに閉じる (秒)
+        self.ping_after = ping_after  # これより長く待機していた接続は使う前に応答を確認する (秒)
+        self.idle = []
+        self.in_use = {}
+        self.created = 0
+        self.reused = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, connect, ping):
+        # (接続, 使い回したかどうか) を返す
+        now = time.monotonic()
+        while True:
+            with self.lock:
+                entry = self.idle.pop() if self.idle else None
+            if entry is None:
+                break
+            if now - entry.created_at >= self.max_lifetime:
+                self._close(entry.connection)
+                continue
+            if now - entry.released_at >= self.ping_after:
+                try:
+                    ping(entry.connection)
+                except Exception:
+                    self._close(entry.connection)
+                    continue
+            with self.lock:
+                self.in_use[id(entry.connection)] = entry
+                self.reused += 1
+            return entry.connection, True
+
+        entry = _Entry(connect())
+        with self.lock:
+            self.in_use[id(entry.connection)] = entry
+            self.created += 1
+        return entry.connection, False
+
+    def release(self, connection):
+        with self.lock:
+            entry = self.in_use.pop(id(connection), None)
+            if entry is not None and len(self.idle) < self.max_size:
+                entry.released_at = time.monotonic()
+                self.idle.append(entry)
+                return
+        self._close(connection)
+
+    def discard(self, connection):
+        with self.lock:
+            self.in_use.pop(id(connection), None)
+        self._close(connection)
+
+    def close_all(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for entry in idle:
+            self._close(entry.connection)
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, max_size, max_lifetime, ping_after):
+    with _pools_lock:
+        if alias not in _pools:
+            _pools[alias] = ConnectionPool(max_size, max_lifetime, ping_after)
+        return _pools[alias]
+
+
+def close_pool(alias):
+    with _pools_lock:
+        pool = _pools.pop(alias, None)
+    if pool is not None:
+        pool.close_all()
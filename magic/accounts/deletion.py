@@ -0,0 +1,67 @@
+from django.contrib.auth.models import User
+from django.db import router, transaction
+
+from .caches import bump_dashboard_version, invalidate_calendar
+from .models import DailyCalorieTotal, Food, FoodFrequency, Meal, MealRevision, RelatedData
+
+# アカウントの分割削除
+# user.delete() は関連する食事などを全件メモリに読み込み、1件ずつシグナルを送ってから削除するので、
+# 記録の多いアカウントでは遅く、メモリも履歴の量に比例して増える。
+# ここでは主キーを batch_size 件ずつ取り出して SQL の DELETE で直接削除する（シグナルは送らない）。
+# 1回の呼び出しで1バッチだけ進め、途中経過は progress (dict) に書き込むので、
+# バックグラウンド処理 (tasks.delete_user) から繰り返し呼び出して使う。
+
+# 食事にぶら下がるデータ（食事より先に削除する）。Meal への外部キーを追加したらここにも加える
+MEAL_DEPENDENTS = [Food, RelatedData, MealRevision]
+# ユーザーごとの集計（食事を消し終えてから削除する）。シグナルで更新されるものなので、まとめて消せばよい
+USER_ROLLUPS = [DailyCalorieTotal, FoodFrequency]
+
+
+def _raw_delete(queryset):
+    # 読み込み・シグナル・連鎖削除なしで DELETE 文を1回だけ実行し、削除した件数を返す
+    return queryset._raw_delete(router.db_for_write(queryset.model))
+
+
+def delete_meals_batch(user_id, batch_size):
+    # 食事を最大 batch_size 件、ぶら下がるデータと一緒に削除して削除した件数を返す
+    meal_ids = list(
+        Meal.objects.filter(user_id=user_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+    )
+    if not meal_ids:
+        return 0
+    with transaction.atomic():
+        for model in MEAL_DEPENDENTS:
+            _raw_delete(model._base_manager.filter(meal_id__in=meal_ids))
+        return _raw_delete(Meal._base_manager.filter(pk__in=meal_ids))
+
+
+def delete_rollups_batch(user_id, batch_size):
+    for model in USER_ROLLUPS:
+        ids = list(model._base_manager.filter(user_id=user_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if ids:
+            return _raw_delete(model._base_manager.filter(pk__in=ids))
+    return 0
+
+
+def delete_account_step(user_id, progress, batch_size):
+    # 1バッチ分だけ削除を進める。アカウントまで削除し終えたら True を返す
+    if 'meals_total' not in progress:
+        progress['meals_total'] = Meal.objects.filter(user_id=user_id).count()
+        progress['meals_deleted'] = 0
+
+    deleted = delete_meals_batch(user_id, batch_size)
+    if deleted:
+        progress['meals_deleted'] += deleted
+        return False
+
+    deleted = delete_rollups_batch(user_id, batch_size)
+    if deleted:
+        progress['rollups_deleted'] = progress.get('rollups_deleted', 0) + deleted
+        return False
+
+    # 残りはプロフィールなど1ユーザーあたり数行なので、通常の削除に任せる
+    with transaction.atomic():
+        User.objects.filter(pk=user_id).delete()
+    invalidate_calendar(user_id)
+    bump_dashboard_version(user_id)
+    return True
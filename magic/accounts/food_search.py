@@ -0,0 +1,159 @@
+import bisect
+import heapq
+import logging
+import threading
+import unicodedata
+from array import array
+from collections import Counter, defaultdict
+
+from django.db import connections
+
+from .caches import food_index_version
+from .models import FoodItem
+
+logger = logging.getLogger('accounts')
+
+# 食品カタログのメモリ上の検索索引
+# 正規化した食品名・読みを並べた配列（二分探索で前方一致）と、
+# 2文字ずつ区切った n-gram の転置索引（部分一致・入力の誤りに強い検索）を持つ。
+# 索引は起動時 (wsgi.py・asgi.py の warm_index) に作成する。食品カタログが変わったら (caches.food_index_version)
+# 別のスレッドで作り直し、できあがるまでは前の索引で検索する（検索のリクエストでは作り直さない）。
+SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+MIN_GRAM_MATCH = 0.5  # あいまい検索で一致が必要な、検索語の 2-gram の割合
+FOOD_ITEM_FIELDS = ['id', 'name', 'reading', 'calories_per_100g', 'serving_grams', 'calories_per_serving']
+
+
+def normalize(text):
+    # 全角・半角の統一 (NFKC)・小文字化・カタカナをひらがなに変換し、空白を除く
+    text = unicodedata.normalize('NFKC', text).lower()
+    return ''.join(
+        chr(ord(char) - 0x60) if 'ァ' <= char <= 'ヶ' else char
+        for char in text if not char.isspace()
+    )
+
+
+def bigrams(key):
+    if len(key) < 2:
+        return {key} if key else set()
+    return {key[i:i + 2] for i in range(len(key) - 1)}
+
+
+class FoodIndex:
+    def __init__(self, rows):
+        # rows は FOOD_ITEM_FIELDS の順に並んだタプル。食品は 0 からの連番 (position) で参照する
+        self.items = []
+        gram_counts = []
+        keys = []
+        postings = defaultdict(list)
+        for position, row in enumerate(rows):
+            self.items.append(row)
+            item_keys = {normalize(row[1])}
+            if row[2]:
+                item_keys.add(normalize(row[2]))
+            grams = set()
+            for key in item_keys:
+                keys.append((key, position))
+                grams |= bigrams(key)
+            for gram in grams:
+                postings[gram].append(position)
+            gram_counts.append(len(grams))
+
+        keys.sort()
+        self.keys = [key for key, _ in keys]
+        self.key_positions = array('l', (position for _, position in keys))
+        self.gram_counts = array('l', gram_counts)
+        self.postings = {gram: array('l', positions) for gram, positions in postings.items()}
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        key = normalize(query)
+        if not key:
+            return []
+
+        # 前方一致（名前か読みが検索語で始まるもの）を辞書順に
+        found = []
+        seen = set()
+        for index in range(bisect.bisect_left(self.keys, key), len(self.keys)):
+            if not self.keys[index].startswith(key) or len(found) >= limit:
+                break
+            position = self.key_positions[index]
+            if position not in seen:
+                seen.add(position)
+                found.append(position)
+
+        # 足りない分は 2-gram の一致数であいまい検索する（一致が多く、名前が短いものを優先）
+        query_grams = bigrams(key)
+        if len(found) < limit and len(key) >= 2:
+            counts = Counter()
+            for gram in query_grams:
+                positions = self.postings.get(gram)
+                if positions is not None:
+                    counts.update(positions)
+            required = MIN_GRAM_MATCH * len(query_grams)
+            candidates = (
+                (-common, self.gram_counts[position], position)
+                for position, common in counts.items()
+                if common >= required and position not in seen
+            )
+            found.extend(position for _, _, position in heapq.nsmallest(limit - len(found), candidates))
+
+        return [dict(zip(FOOD_ITEM_FIELDS, self.items[position])) for position in found]
+
+
+_lock = threading.Lock()  # _index・_index_version・_rebuilding の更新
+_build_lock = threading.Lock()  # 起動時に作っていなかった場合の最初の作成
+_index = None
+_index_version = None
+_rebuilding = False
+
+
+def build_index():
+    global _index, _index_version
+    # 作成中にカタログが変わった場合は、次の検索でバージョンが合わずにもう一度作り直す
+    version = food_index_version()
+    rows = FoodItem.objects.order_by('pk').values_list(*FOOD_ITEM_FIELDS).iterator(chunk_size=5000)
+    index = FoodIndex(rows)
+    with _lock:
+        _index, _index_version = index, version
+
+
+def warm_index():
+    # 起動時に索引を作っておく（失敗しても起動は続け、最初の検索で作る）
+    try:
+        build_index()
+    except Exception:
+        logger.exception('Failed to build the food index')
+
+
+def _rebuild():
+    global _rebuilding
+    try:
+        build_index()
+    except Exception:
+        logger.exception('Failed to rebuild the food index')
+    finally:
+        # このスレッドで開いたデータベース接続を閉じる
+        connections.close_all()
+        with _lock:
+            _rebuilding = False
+
+
+def get_index():
+    global _rebuilding
+    if _index is None:
+        # 起動時に作っていない場合（開発サーバー・管理コマンドなど）だけ、最初の検索で作る
+        with _build_lock:
+            if _index is None:
+                build_index()
+        return _index
+
+    if _index_version != food_index_version():
+        with _lock:
+            start, _rebuilding = not _rebuilding, True
+        if start:
+            threading.Thread(target=_rebuild, name='food-index-rebuild', daemon=True).start()
+    return _index
+
+
+def search_foods(query, limit=SEARCH_LIMIT):
+    return get_index().search(query, min(limit, MAX_SEARCH_LIMIT))
@@ -1,9 +1,10 @@
 from django import forms
+from django.conf import settings
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm, UserChangeForm
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
-from .models import Meal, Food, UserProfile
-from django.forms import inlineformset_factory
+from .models import Meal, Food, FoodItem, UserProfile, resolve_target_calories
+from django.forms import formset_factory, inlineformset_factory
 
 class RegistrationForm(UserCreationForm):
     GENDER_CHOICES = (
@@ -46,7 +47,8 @@ class RegistrationForm(UserCreationForm):
             # UserProfileはpost_saveシグナルで作成される
             UserProfile.objects.filter(user=user).update(
                 age=self.cleaned_data['age'],
-                gender=self.cleaned_data['gender']
+                gender=self.cleaned_data['gender'],
+                target_calories=resolve_target_calories(self.cleaned_data['age'], self.cleaned_data['gender']),
             )
         return user
 
@@ -115,3 +117,23 @@ class MealEditForm(forms.ModelForm):
         }
 FoodFormSet = inlineformset_factory(Meal, Food, fields=('name',), extra=1, can_delete=True)
 
+# まとめて入力の1行
+# 日付の初期値（今日）は画面を開いた日の値なので、日付以外が空なら空の行とみなす
+# （日付をまたいで送信しても、空の行が入力ありとして検証されないように）
+class BatchMealForm(MealForm):
+    def has_changed(self):
+        return any(name != 'date' for name in self.changed_data)
+
+
+# 複数の食事をまとめて入力するフォームセット（空の行は無視される）
+MealFormSet = formset_factory(BatchMealForm, extra=3, max_num=settings.MEAL_BATCH_MAX_SIZE, validate_max=True)
+
+
+# 食品カタログの一括読み込み用（同じ名前の食品は上書きするので重複チェックはしない）
+class FoodItemImportForm(forms.ModelForm):
+    class Meta:
+        model = FoodItem
+        fields = ['name', 'reading', 'calories_per_100g', 'serving_grams', 'calories_per_serving']
+
+    def validate_unique(self):
+        pass
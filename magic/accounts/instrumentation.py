@@ -0,0 +1,119 @@
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+from django.template.backends.django import Template as DjangoTemplate
+
+
+# 取得行数を数えるためのカーソルのラッパー
+class _RowCountingCursor:
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def __getattr__(self, attr):
+        return getattr(self._cursor, attr)
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._stats.rows += 1
+            yield row
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats.rows += len(rows)
+        return rows
+
+
+# SQL の実行回数・時間・取得行数・重複クエリ数を集計する
+class QueryStats:
+    def __init__(self, count_rows=True):
+        self.count_rows = count_rows
+        self.queries = 0
+        self.duration = 0.0
+        self.rows = 0
+        self.statements = Counter()
+
+    @property
+    def duplicates(self):
+        # 同じ SQL（パラメータ違いを含む）が2回目以降に実行された回数。N+1 の目安になる
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.queries += 1
+            self.statements[sql] += 1
+            cursor = context['cursor']
+            if self.count_rows and not isinstance(cursor.cursor, _RowCountingCursor):
+                cursor.cursor = _RowCountingCursor(cursor.cursor, self)
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'sql_ms': self.duration * 1000,
+            'rows': self.rows,
+            'duplicates': self.duplicates,
+        }
+
+
+@contextmanager
+def capture_queries(using=None, count_rows=True):
+    # with capture_queries() as stats: ... の形で使う。using を省略するとすべてのデータベースが対象
+    stats = QueryStats(count_rows=count_rows)
+    aliases = [using] if using else list(connections)
+    with ExitStack() as stack:
+        for alias in aliases:
+            stack.enter_context(connections[alias].execute_wrapper(stats))
+        yield stats
+
+
+# テンプレートの描画回数と時間を集計する
+class TemplateStats:
+    def __init__(self):
+        self.renders = 0
+        self.duration = 0.0
+        self.depth = 0
+
+
+@contextmanager
+def capture_templates():
+    # with capture_templates() as stats: ... の形で使う（計測コマンド用）
+    # render() / render_to_string() が呼ぶバックエンドの Template.render を一時的に差し替える。
+    # フォーム部品や {% include %} などの内側の描画は外側の時間に含まれるので、一番外側だけを数える。
+    # スレッドをまたいで使わないこと
+    stats = TemplateStats()
+    original = DjangoTemplate.render
+
+    def render(self, context=None, request=None):
+        if stats.depth:
+            return original(self, context, request)
+        stats.depth += 1
+        start = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            stats.duration += time.perf_counter() - start
+            stats.renders += 1
+            stats.depth -= 1
+
+    DjangoTemplate.render = render
+    try:
+        yield stats
+    finally:
+        DjangoTemplate.render = original
@@ -0,0 +1,96 @@
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger('accounts')
+
+# データベースをキューにしたバックグラウンド処理
+# @task で登録した関数を enqueue() で Job テーブルに積み、run_worker コマンドが1件ずつ実行する。
+# 時間のかかる処理は1回の実行で一定量だけ進めて MORE を返すと、進捗 (job.progress) を保存して
+# すぐに続きが実行される。例外が起きた場合は max_attempts 回まで間隔をあけて再実行する。
+TASKS = {}
+MORE = object()  # 処理の途中で返すと、続きを次の実行に回す
+
+
+def task(name, max_attempts=None):
+    def register(func):
+        TASKS[name] = (func, max_attempts or settings.JOB_MAX_ATTEMPTS)
+        return func
+    return register
+
+
+def enqueue(name, payload=None, user=None):
+    if name not in TASKS:
+        raise ValueError(f'未登録の処理です: {name}')
+    return Job.objects.create(name=name, payload=payload or {}, user=user, max_attempts=TASKS[name][1])
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim_next(worker):
+    # 実行できる処理を1件取り出して実行中にする。ワーカーが止まって残った実行中の処理も取り直す
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    queryset = Job.objects.filter(
+        Q(status=Job.QUEUED, run_after__lte=now) | Q(status=Job.RUNNING, locked_at__lt=stale)
+    ).order_by('run_after', 'pk')
+    with transaction.atomic():
+        # 複数のワーカーで同じ処理を取り合わないよう、ロック中の行は飛ばす (MySQL 8 / MariaDB 10.6 以降)
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        job = queryset.first()
+        if job is None:
+            return None
+        job.status = Job.RUNNING
+        job.locked_by = worker
+        job.locked_at = now
+        job.attempts += 1
+        job.save(update_fields=['status', 'locked_by', 'locked_at', 'attempts', 'updated_at'])
+    return job
+
+
+def run_job(job):
+    func, _ = TASKS.get(job.name, (None, None))
+    try:
+        if func is None:
+            raise LookupError(f'未登録の処理です: {job.name}')
+        result = func(job)
+    except Exception:
+        job.error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            # 再実行までの間隔は試行ごとに倍にする
+            job.status = Job.QUEUED
+            job.run_after = timezone.now() + timedelta(seconds=settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+            logger.warning(f'Job {job} failed (attempt {job.attempts}/{job.max_attempts}), retrying')
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+            logger.error(f'Job {job} failed after {job.attempts} attempts')
+        job.locked_by = ''
+        job.locked_at = None
+        job.save()
+        return job
+
+    if result is MORE:
+        # 続きはすぐに実行する（区切りごとの成功で試行回数は数え直す）
+        job.status = Job.QUEUED
+        job.attempts = 0
+    else:
+        job.status = Job.SUCCEEDED
+        job.result = result
+        job.finished_at = timezone.now()
+    job.locked_by = ''
+    job.locked_at = None
+    job.save()
+    return job
@@ -0,0 +1,218 @@
+import json
+import random
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from accounts.bench import bench_database, percentile, seed_meals
+from accounts.instrumentation import capture_queries, capture_templates
+from accounts.models import Meal
+
+
+# 計測対象の URL（名前, メソッド, URL と送信データを作る関数）
+# ログアウト・アカウント削除・新規登録はセッションやユーザーを壊すので対象外
+def _meal_post_data(ctx):
+    return {
+        'meal_type': ctx.rng.choice(['breakfast', 'lunch', 'dinner']),
+        'food_name': 'ベンチマーク',
+        'date': ctx.random_date().isoformat(),
+        'calories': str(ctx.rng.randint(200, 1200)),
+        'eaten_at': '12:00',
+    }
+
+
+SCENARIOS = [
+    ('index', 'get', lambda ctx: (reverse('index'), None)),
+    ('login', 'get', lambda ctx: (reverse('login'), None)),
+    ('home', 'get', lambda ctx: (reverse('home'), None)),
+    ('add_meal', 'get', lambda ctx: (reverse('add_meal'), None)),
+    ('add_meal:post', 'post', lambda ctx: (reverse('add_meal'), _meal_post_data(ctx))),
+    ('enter_meal_data', 'get', lambda ctx: (reverse('enter_meal_data'), {'selected_date': ctx.random_date().isoformat()})),
+    ('calories_by_year', 'get', lambda ctx: (reverse('calories_by_year', args=[ctx.random_date().year]), None)),
+    ('calories_by_range', 'get', lambda ctx: (reverse('calories_by_range'), {'from': ctx.dates[0].isoformat(), 'to': ctx.dates[-1].isoformat()})),
+    ('calories_by_month', 'get', lambda ctx: (reverse('calories_by_month', args=[ctx.random_date().year, ctx.random_date().month]), None)),
+    ('trends_api', 'get', lambda ctx: (reverse('trends_api'), {'period': '10y'})),
+    ('edit_meal', 'get', lambda ctx: (reverse('edit_meal', args=[ctx.meal_to_edit()]), None)),
+    ('edit_meal:post', 'post', lambda ctx: (reverse('edit_meal', args=[ctx.meal_to_edit()]), _meal_post_data(ctx))),
+    ('confirm_delete_meal', 'get', lambda ctx: (reverse('confirm_delete_meal', args=[ctx.meal_to_edit()]), None)),
+    ('delete_meal:post', 'post', lambda ctx: (reverse('delete_meal', args=[ctx.meal_to_delete()]), None)),
+    ('delete_meal_complete', 'get', lambda ctx: (reverse('delete_meal_complete'), None)),
+    ('edit_profile', 'get', lambda ctx: (reverse('edit_profile'), None)),
+    ('update_profile', 'get', lambda ctx: (reverse('update_profile'), None)),
+    ('change_password', 'get', lambda ctx: (reverse('change_password'), None)),
+    ('selected_date', 'get', lambda ctx: (reverse('selected_date'), {'selected_date': ctx.random_date().isoformat()})),
+    ('success', 'get', lambda ctx: (reverse('success'), None)),
+    ('calorie_warning', 'get', lambda ctx: (reverse('calorie_warning'), None)),
+    ('update_complete', 'get', lambda ctx: (reverse('update-complete'), None)),
+    ('password_changed', 'get', lambda ctx: (reverse('password_changed'), None)),
+    ('registration_complete', 'get', lambda ctx: (reverse('registration_complete'), None)),
+    ('logout_complete', 'get', lambda ctx: (reverse('logout_complete'), None)),
+]
+
+
+# --legacy-sessions で再現する以前のセッション設定（毎リクエストでデータベースに保存）
+LEGACY_SESSION_SETTINGS = {
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+    'SESSION_SAVE_EVERY_REQUEST': True,
+}
+
+
+def uncached_template_settings():
+    # テンプレートを毎回読み込み・解析し、固定ページも毎回描画する設定
+    templates = [dict(settings.TEMPLATES[0])]
+    templates[0]['OPTIONS'] = dict(templates[0]['OPTIONS'], loaders=[
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ])
+    return {'TEMPLATES': templates, 'TEMPLATE_CACHE': False}
+
+
+class _Context:
+    def __init__(self, user, rng):
+        self.user = user
+        self.rng = rng
+        meals = Meal.objects.filter(user=user).order_by('pk')
+        self.dates = list(meals.values_list('date', flat=True).distinct())
+        meal_ids = list(meals.values_list('pk', flat=True))
+        # 編集用と削除用で別の食事を使う
+        half = len(meal_ids) // 2
+        self.edit_ids = meal_ids[:half]
+        self.delete_ids = meal_ids[half:]
+
+    def random_date(self):
+        return self.rng.choice(self.dates)
+
+    def meal_to_edit(self):
+        return self.rng.choice(self.edit_ids)
+
+    def meal_to_delete(self):
+        return self.delete_ids.pop()
+
+
+class Command(BaseCommand):
+    help = 'accounts の各 URL のレイテンシと SQL 発行数を計測します（テスト用データベースを使用）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=3, help='作成するユーザー数')
+        parser.add_argument('--meals', type=int, default=1000, help='ユーザーごとの食事件数')
+        parser.add_argument('--seed', type=int, default=0, help='合成データの乱数シード')
+        parser.add_argument('--iterations', type=int, default=30, help='URL ごとの計測回数')
+        parser.add_argument('--warmup', type=int, default=2, help='計測前の空回し回数')
+        parser.add_argument('--only', nargs='*', help='計測するシナリオ名（省略時はすべて）')
+        parser.add_argument('--output', help='結果を書き出す JSON ファイルのパス')
+        parser.add_argument(
+            '--legacy-sessions', action='store_true',
+            help='以前のセッション設定（db に毎回保存）で計測する。session_writes の比較用',
+        )
+        parser.add_argument(
+            '--uncached-templates', action='store_true',
+            help='テンプレートと固定ページをキャッシュせずに計測する。template_ms の比較用',
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations には 1 以上を指定してください')
+        scenarios = SCENARIOS
+        if options['only']:
+            scenarios = [scenario for scenario in SCENARIOS if scenario[0] in options['only']]
+
+        overrides = {}
+        if options['legacy_sessions']:
+            middleware = [
+                'django.contrib.sessions.middleware.SessionMiddleware'
+                if name == 'accounts.middleware.SessionRefreshMiddleware' else name
+                for name in settings.MIDDLEWARE
+            ]
+            overrides = dict(LEGACY_SESSION_SETTINGS, MIDDLEWARE=middleware)
+        if options['uncached_templates']:
+            overrides.update(uncached_template_settings())
+
+        with bench_database(), override_settings(**overrides):
+            session_engine = settings.SESSION_ENGINE
+            results = self.run(scenarios, options)
+
+        report = {
+            'config': {
+                'users': options['users'],
+                'meals': options['meals'],
+                'seed': options['seed'],
+                'iterations': options['iterations'],
+                'database': connection.vendor,
+                'session_engine': session_engine,
+                'template_cache': not options['uncached_templates'],
+                'django': django.get_version(),
+            },
+            'results': results,
+        }
+        self.print_table(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+            self.stdout.write(f"結果を {options['output']} に書き出しました")
+
+    def run(self, scenarios, options):
+        users = seed_meals(options['users'], options['meals'], seed=options['seed'])
+        rng = random.Random(options['seed'])
+        contexts = [_Context(user, rng) for user in users]
+        clients = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+
+        results = {}
+        for name, method, build in scenarios:
+            samples = []
+            for iteration in range(options['warmup'] + options['iterations']):
+                index = iteration % len(users)
+                url, data = build(contexts[index])
+                with capture_queries() as stats, capture_templates() as templates:
+                    start = time.perf_counter()
+                    response = getattr(clients[index], method)(url, data or {})
+                    elapsed = time.perf_counter() - start
+                if response.status_code >= 400:
+                    self.stderr.write(f'{name}: {url} が {response.status_code} を返しました')
+                # セッションが保存されたレスポンスではセッション Cookie が送り直される
+                session_written = settings.SESSION_COOKIE_NAME in response.cookies
+                if iteration >= options['warmup']:
+                    samples.append((elapsed * 1000, stats, templates, session_written))
+            results[name] = self.summarize(samples)
+        return results
+
+    def summarize(self, samples):
+        latencies = [latency for latency, _, _, _ in samples]
+        count = len(samples)
+        return {
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'queries': sum(stats.queries for _, stats, _, _ in samples) / count,
+            'sql_ms': round(sum(stats.duration for _, stats, _, _ in samples) * 1000 / count, 3),
+            'rows': sum(stats.rows for _, stats, _, _ in samples) / count,
+            'duplicates': sum(stats.duplicates for _, stats, _, _ in samples) / count,
+            # 1リクエストあたりのテンプレート描画時間と、それを除いたビュー（SQL を含む）の時間
+            'template_ms': round(sum(templates.duration for _, _, templates, _ in samples) * 1000 / count, 3),
+            'view_ms': round(
+                sum(latency - templates.duration * 1000 for latency, _, templates, _ in samples) / count, 3
+            ),
+            'session_writes': sum(written for _, _, _, written in samples) / count,
+        }
+
+    def print_table(self, results):
+        header = (
+            f"{'view':<24}{'p50 ms':>10}{'p95 ms':>10}{'view ms':>9}{'tmpl ms':>9}"
+            f"{'queries':>9}{'rows':>9}{'dup':>6}{'session':>9}"
+        )
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<24}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+                f"{result['view_ms']:>9.2f}{result['template_ms']:>9.2f}"
+                f"{result['queries']:>9.1f}{result['rows']:>9.1f}{result['duplicates']:>6.1f}"
+                f"{result['session_writes']:>9.2f}"
+            )
@@ -0,0 +1,87 @@
+import copy
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.db.utils import load_backend
+
+from accounts.bench import percentile
+from accounts.db.pool import close_pool
+
+POOLED_ENGINE = 'accounts.db.mysql_pooled'
+
+
+# 接続の使い方ごとの1リクエストあたりのレイテンシの計測
+# リクエストの開始・終了時に Django が行う接続の確認・切断 (close_old_connections) を再現し、
+# その間に軽いクエリを実行する。読み込みだけなので、本番のデータベースに向けても実行できる。
+# ネットワーク越しの差を見るときは、settings.py の例のようにローカルの MariaDB コンテナに向けて実行する
+class Command(BaseCommand):
+    help = 'データベース接続の使い方（毎回接続・接続の持続・接続プール）ごとのリクエストあたりのレイテンシを計測します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='計測するデータベース')
+        parser.add_argument('--requests', type=int, default=200, help='モードごとのリクエスト数')
+        parser.add_argument('--queries', type=int, default=3, help='1リクエストあたりのクエリ数')
+        parser.add_argument('--output', help='結果を書き出す JSON ファイルのパス')
+
+    def handle(self, *args, **options):
+        base = copy.deepcopy(connections[options['database']].settings_dict)
+        engine = 'django.db.backends.mysql' if base['ENGINE'] == POOLED_ENGINE else base['ENGINE']
+        modes = [
+            ('per-request', dict(ENGINE=engine, CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False)),
+            ('persistent', dict(ENGINE=engine, CONN_MAX_AGE=300, CONN_HEALTH_CHECKS=True)),
+        ]
+        if engine == 'django.db.backends.mysql':
+            modes.append(('pooled', dict(ENGINE=POOLED_ENGINE, CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False)))
+
+        results = {}
+        for name, overrides in modes:
+            settings_dict = dict(copy.deepcopy(base), **overrides)
+            results[name] = self.run(name, settings_dict, options)
+
+        self.stdout.write(f"{'mode':<14}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}{'connects':>10}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<14}{result['p50_ms']:>10.3f}{result['p95_ms']:>10.3f}"
+                f"{result['mean_ms']:>10.3f}{result['connects']:>10}"
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump({'vendor': connections[options['database']].vendor, 'results': results}, f, indent=2)
+            self.stdout.write(f"結果を {options['output']} に書き出しました")
+
+    def run(self, name, settings_dict, options):
+        alias = f'bench-{name}'
+        wrapper = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, alias)
+        connects = 0
+
+        def count_connect(sender, connection, **kwargs):
+            nonlocal connects
+            if connection is wrapper and not getattr(connection, 'pool_reused', False):
+                connects += 1
+
+        connection_created.connect(count_connect)
+        latencies = []
+        try:
+            for _ in range(options['requests']):
+                start = time.perf_counter()
+                # request_started / request_finished で呼ばれる処理と同じ
+                wrapper.close_if_unusable_or_obsolete()
+                with wrapper.cursor() as cursor:
+                    for _ in range(options['queries']):
+                        cursor.execute('SELECT 1')
+                        cursor.fetchone()
+                wrapper.close_if_unusable_or_obsolete()
+                latencies.append((time.perf_counter() - start) * 1000)
+        finally:
+            connection_created.disconnect(count_connect)
+            wrapper.close()
+            close_pool(alias)
+        return {
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'mean_ms': round(sum(latencies) / len(latencies), 3),
+            'connects': connects,
+        }
@@ -0,0 +1,60 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from accounts.models import CohortSummary, DailyCalorieTotal, UserProfile, age_band
+
+
+# 年齢層・性別ごとの摂取カロリーの集計を作成する（cron などで毎晩実行する）
+# Meal テーブルではなく日別集計 (DailyCalorieTotal) を1回読み込み、Python で集計する
+class Command(BaseCommand):
+    help = '管理画面のコホート集計 (CohortSummary) を日別集計から作成します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='集計する日数')
+        parser.add_argument('--end', help='集計終了日 YYYY-MM-DD（省略時は昨日）')
+
+    def handle(self, *args, **options):
+        end = parse_date(options['end']) if options['end'] else date.today() - timedelta(days=1)
+        if end is None:
+            raise CommandError('--end は YYYY-MM-DD 形式で指定してください')
+        start = end - timedelta(days=options['days'] - 1)
+
+        # ユーザーごとの年齢層・性別・目標カロリー
+        profiles = {
+            user_id: ((age_band(age), gender), target)
+            for user_id, age, gender, target in UserProfile.objects.values_list('user_id', 'age', 'gender', 'target_calories')
+        }
+        cohorts = {}
+        rows = DailyCalorieTotal.objects.filter(date__range=(start, end)).order_by().values_list('user_id', 'total')
+        for user_id, total in rows.iterator(chunk_size=5000):
+            profile = profiles.get(user_id)
+            if profile is None:
+                continue
+            key, target = profile
+            cohort = cohorts.setdefault(key, {'users': set(), 'logged_days': 0, 'calories': 0, 'over_target_days': 0})
+            cohort['users'].add(user_id)
+            cohort['logged_days'] += 1
+            cohort['calories'] += total
+            cohort['over_target_days'] += total > target
+
+        summaries = [
+            CohortSummary(
+                period_start=start,
+                period_end=end,
+                age_band=band,
+                gender=gender,
+                users=len(cohort['users']),
+                logged_days=cohort['logged_days'],
+                average_daily_calories=round(cohort['calories'] / cohort['logged_days'], 1),
+                over_target_days=cohort['over_target_days'],
+                over_target_share=round(cohort['over_target_days'] / cohort['logged_days'], 3),
+            )
+            for (band, gender), cohort in sorted(cohorts.items())
+        ]
+        with transaction.atomic():
+            CohortSummary.objects.filter(period_end=end).delete()
+            CohortSummary.objects.bulk_create(summaries)
+        self.stdout.write(f'{start} 〜 {end} の {len(summaries)} 区分を集計しました')
@@ -0,0 +1,31 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import meal_io
+
+
+# 食事データの一括インポート
+class Command(BaseCommand):
+    help = 'CSV / JSON Lines の食事データをユーザーに一括で取り込みます'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='取り込み先のユーザー名')
+        parser.add_argument('path', help='CSV (.csv) または JSON Lines (.jsonl) のファイル')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='ファイル形式（省略時は拡張子から判定）')
+        parser.add_argument('--batch-size', type=int, default=meal_io.IMPORT_BATCH_SIZE, help='1トランザクションで保存する件数')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"ユーザー {options['username']} が見つかりません")
+        file_format = options['format'] or meal_io.guess_format(options['path'])
+        if file_format is None:
+            raise CommandError('ファイル形式を判定できません。--format を指定してください')
+
+        with open(options['path'], 'rb') as f:
+            result = meal_io.import_meals(user, meal_io.iter_rows(f, file_format), batch_size=options['batch_size'])
+
+        for error in result['errors']:
+            self.stderr.write(f"{error['line']} 行目: {error['errors']}")
+        self.stdout.write(f"{result['created']} 件を取り込みました（エラー {result['error_count']} 件）")
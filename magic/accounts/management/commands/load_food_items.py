@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from accounts.caches import bump_food_index_version
+from accounts.forms import FoodItemImportForm
+from accounts.meal_io import IMPORT_BATCH_SIZE, MAX_IMPORT_ERRORS, iter_csv_rows
+from accounts.models import FoodItem
+
+FOOD_ITEM_UPDATE_FIELDS = ['reading', 'calories_per_100g', 'serving_grams', 'calories_per_serving']
+
+
+# 食品カタログの一括読み込み
+# CSV の列: name, reading, calories_per_100g, serving_grams, calories_per_serving
+# 同じ名前の食品がすでにある場合は上書きする
+class Command(BaseCommand):
+    help = '食品カタログを CSV から一括で読み込みます'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV ファイル（ヘッダー行つき）')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='1トランザクションで保存する件数')
+
+    def handle(self, *args, **options):
+        loaded = 0
+        errors = 0
+        batch = {}
+        with open(options['path'], 'rb') as f:
+            for line_number, row in iter_csv_rows(f):
+                form = FoodItemImportForm(data=row)
+                if not form.is_valid():
+                    errors += 1
+                    if errors <= MAX_IMPORT_ERRORS:
+                        self.stderr.write(f'{line_number} 行目: {dict(form.errors)}')
+                    continue
+                # 同じバッチ内で名前が重複した場合は後の行を使う
+                item = form.save(commit=False)
+                batch[item.name] = item
+                if len(batch) >= options['batch_size']:
+                    loaded += self.save(batch.values())
+                    batch = {}
+        if batch:
+            loaded += self.save(batch.values())
+
+        # bulk_create はシグナルを送らないので、検索索引の作り直しを直接知らせる
+        bump_food_index_version()
+        self.stdout.write(f'{loaded} 件を読み込みました（エラー {errors} 件）')
+
+    def save(self, items):
+        items = list(items)
+        # MySQL (ON DUPLICATE KEY UPDATE) は対象の列を指定できない
+        unique_fields = ['name'] if connection.features.supports_update_conflicts_with_target else None
+        with transaction.atomic():
+            FoodItem.objects.bulk_create(
+                items, update_conflicts=True, unique_fields=unique_fields, update_fields=FOOD_ITEM_UPDATE_FIELDS,
+            )
+        return len(items)
@@ -0,0 +1,175 @@
+import asyncio
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import ModuleType
+
+import django
+from asgiref.sync import ThreadSensitiveContext
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import include, path
+
+from accounts import urls as accounts_urls
+from accounts.bench import bench_database, percentile, seed_meals
+
+from .bench_accounts import SCENARIOS, _Context
+
+# 同期版 (WSGI・スレッド) と非同期版 (ASGI・イベントループ) のビューを同じデータで同時接続数を変えて比べる
+# 読み込み中心のシナリオだけを対象にする
+LOADTEST_SCENARIOS = ['home', 'enter_meal_data', 'calories_by_year', 'calories_by_range', 'calories_by_month']
+
+
+def _urlconf(use_async):
+    patterns = accounts_urls.sync_urlpatterns
+    if use_async:
+        patterns = accounts_urls.with_async_views(patterns)
+    # ROOT_URLCONF にはモジュールも指定できるので、その場で URL 設定のモジュールを作る
+    urlconf = ModuleType(f"loadtest_urls_{'async' if use_async else 'sync'}")
+    urlconf.urlpatterns = [
+        path('admin/', admin.site.urls),
+        path('accounts/', include(patterns)),
+    ]
+    return urlconf
+
+
+class Command(BaseCommand):
+    help = '同期 (WSGI) と非同期 (ASGI) のビューのスループットを比較します（テスト用データベースを使用）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=3, help='作成するユーザー数')
+        parser.add_argument('--meals', type=int, default=1000, help='ユーザーごとの食事件数')
+        parser.add_argument('--seed', type=int, default=0, help='合成データの乱数シード')
+        parser.add_argument('--requests', type=int, default=200, help='シナリオごとのリクエスト数')
+        parser.add_argument('--concurrency', type=int, default=20, help='同時に接続するクライアント数')
+        parser.add_argument('--only', nargs='*', choices=LOADTEST_SCENARIOS, help='計測するシナリオ名（省略時はすべて）')
+        parser.add_argument('--output', help='結果を書き出す JSON ファイルのパス')
+
+    def handle(self, *args, **options):
+        names = options['only'] or LOADTEST_SCENARIOS
+        scenarios = [scenario for scenario in SCENARIOS if scenario[0] in names]
+
+        with bench_database():
+            results = self.run(scenarios, options)
+
+        report = {
+            'config': {
+                'users': options['users'],
+                'meals': options['meals'],
+                'seed': options['seed'],
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'database': connection.vendor,
+                'django': django.get_version(),
+            },
+            'results': results,
+        }
+        self.print_table(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+            self.stdout.write(f"結果を {options['output']} に書き出しました")
+
+    def run(self, scenarios, options):
+        users = seed_meals(options['users'], options['meals'], seed=options['seed'])
+        rng = random.Random(options['seed'])
+        contexts = [_Context(user, rng) for user in users]
+        concurrency = options['concurrency']
+
+        results = {}
+        for name, method, build in scenarios:
+            # 両方の方式で同じリクエストを送るよう、URL は先に作っておく
+            plan = []
+            for number in range(options['requests']):
+                index = number % len(users)
+                plan.append((index, *build(contexts[index])))
+            # クライアント k は plan[k::concurrency] を順番に送る
+            shares = [plan[worker::concurrency] for worker in range(concurrency)]
+
+            results[name] = {}
+            for mode in ('sync', 'async'):
+                with override_settings(ROOT_URLCONF=_urlconf(mode == 'async')):
+                    cache.clear()
+                    clients = self.make_clients(mode, users, concurrency)
+                    # ログイン直後のセッション更新とキャッシュの作成を計測から外す
+                    # （SQLite は同時書き込みでロックエラーになるので1クライアントずつ）
+                    for worker_clients in clients:
+                        self.run_mode(mode, [worker_clients], [plan[:len(users)]])
+                    start = time.perf_counter()
+                    samples = self.run_mode(mode, clients, shares)
+                    elapsed = time.perf_counter() - start
+                results[name][mode] = self.summarize(samples, elapsed)
+        return results
+
+    def make_clients(self, mode, users, concurrency):
+        client_class = AsyncClient if mode == 'async' else Client
+        clients = []
+        for worker in range(concurrency):
+            worker_clients = []
+            for user in users:
+                client = client_class()
+                client.force_login(user)
+                worker_clients.append(client)
+            clients.append(worker_clients)
+        return clients
+
+    def run_mode(self, mode, clients, shares):
+        if mode == 'async':
+            return asyncio.run(self.run_async(clients, shares))
+        return self.run_sync(clients, shares)
+
+    def run_sync(self, clients, shares):
+        # 1クライアントにつき1スレッド（WSGI サーバーのスレッドに相当）
+        def worker(number):
+            samples = []
+            try:
+                for index, url, data in shares[number]:
+                    start = time.perf_counter()
+                    response = clients[number][index].get(url, data or {})
+                    samples.append((time.perf_counter() - start, response.status_code))
+            finally:
+                connections.close_all()
+            return samples
+
+        with ThreadPoolExecutor(max_workers=len(shares)) as executor:
+            return [sample for samples in executor.map(worker, range(len(shares))) for sample in samples]
+
+    async def run_async(self, clients, shares):
+        # 1つのイベントループで全クライアントを並行に動かす（ASGI サーバーのワーカーに相当）
+        async def worker(number):
+            samples = []
+            for index, url, data in shares[number]:
+                start = time.perf_counter()
+                # ASGIHandler と同じく、リクエストごとに同期処理用のスレッドを分ける
+                async with ThreadSensitiveContext():
+                    response = await clients[number][index].get(url, data or {})
+                samples.append((time.perf_counter() - start, response.status_code))
+            return samples
+
+        results = await asyncio.gather(*(worker(number) for number in range(len(shares))))
+        return [sample for samples in results for sample in samples]
+
+    def summarize(self, samples, elapsed):
+        latencies = [latency * 1000 for latency, _ in samples]
+        return {
+            'requests': len(samples),
+            'errors': sum(status >= 400 for _, status in samples),
+            'rps': round(len(samples) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+        }
+
+    def print_table(self, results):
+        header = f"{'view':<20}{'mode':<7}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, modes in results.items():
+            for mode, result in modes.items():
+                self.stdout.write(
+                    f"{name:<20}{mode:<7}{result['rps']:>10.1f}{result['p50_ms']:>10.2f}"
+                    f"{result['p95_ms']:>10.2f}{result['errors']:>8}"
+                )
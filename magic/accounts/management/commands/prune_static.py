@@ -0,0 +1,43 @@
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand, CommandError
+
+
+# STATIC_ROOT の古いファイルの削除
+# collectstatic を繰り返すと、以前のハッシュ付きのファイルや、同名のファイルがあったときに
+# 作られる重複 (base_95nU0g8.css など) が残るので、staticfiles.json に載っていないファイルを消す
+class Command(BaseCommand):
+    help = 'STATIC_ROOT から staticfiles.json に載っていない古い静的ファイルを削除します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='削除せずに対象だけ表示する')
+
+    def handle(self, *args, **options):
+        manifest = getattr(staticfiles_storage, 'hashed_files', None)
+        if not manifest:
+            raise CommandError('staticfiles.json がありません。先に collectstatic を実行してください')
+
+        keep = {staticfiles_storage.manifest_name}
+        for name in list(manifest) + list(manifest.values()):
+            keep.update([name, name + '.gz', name + '.br'])
+
+        removed = 0
+        removed_bytes = 0
+        root = settings.STATIC_ROOT
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                if name in keep:
+                    continue
+                removed += 1
+                removed_bytes += os.path.getsize(path)
+                if options['verbosity'] > 1 or options['dry_run']:
+                    self.stdout.write(name)
+                if not options['dry_run']:
+                    os.remove(path)
+
+        action = '削除対象' if options['dry_run'] else '削除しました'
+        self.stdout.write(f'{action}: {removed} ファイル ({removed_bytes / 1024:.0f} KB)')
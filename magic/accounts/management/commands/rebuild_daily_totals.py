@@ -0,0 +1,28 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from accounts import jobs
+from accounts.tasks import rebuild_user_daily_totals
+
+
+# 日別カロリー集計の再構築
+class Command(BaseCommand):
+    help = '食事データから日別カロリー集計 (DailyCalorieTotal) を作り直します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='対象ユーザー名（省略時は全ユーザー）')
+        parser.add_argument('--background', action='store_true', help='ユーザーごとにバックグラウンド処理として登録する (run_worker で実行)')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        for user_id, username in users.values_list('pk', 'username').iterator():
+            if options['background']:
+                job = jobs.enqueue('rebuild_daily_totals', {'user_id': user_id})
+                self.stdout.write(f'{username}: 日別集計の再構築を登録しました ({job})')
+                continue
+            # バックグラウンド処理と同じ手順（トランザクション内で作り直し、キャッシュを無効化）
+            days = rebuild_user_daily_totals(user_id)
+            self.stdout.write(f'{username}: 日別集計を再構築しました ({days}日)')
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from accounts import jobs
+
+
+# バックグラウンド処理のワーカー（1台のサーバーでも動くよう、データベースをキューとして使う）
+# 複数起動してもよい。止めるときは Ctrl+C（実行中の区切りが終わってから止まる）
+class Command(BaseCommand):
+    help = 'バックグラウンド処理 (accounts.jobs) を実行するワーカーを起動します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sleep', type=float, default=1.0, help='処理がないときに待つ秒数')
+        parser.add_argument('--once', action='store_true', help='実行できる処理がなくなったら終了する')
+        parser.add_argument('--max-jobs', type=int, help='この回数だけ実行したら終了する')
+
+    def handle(self, *args, **options):
+        worker = jobs.worker_name()
+        self.stdout.write(f'ワーカー {worker} を起動しました（登録済みの処理: {", ".join(sorted(jobs.TASKS))}）')
+        executed = 0
+        try:
+            while options['max_jobs'] is None or executed < options['max_jobs']:
+                close_old_connections()
+                job = jobs.claim_next(worker)
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+                start = time.perf_counter()
+                job = jobs.run_job(job)
+                executed += 1
+                self.stdout.write(f'{job} {(time.perf_counter() - start) * 1000:.0f}ms')
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f'ワーカー {worker} を終了しました（{executed} 回実行）')
@@ -0,0 +1,214 @@
+import csv
+import io
+import json
+
+from django.db import transaction
+
+from .forms import MealForm
+from .models import DailyCalorieTotal, FoodFrequency, Meal, MealRevision
+from .signals import meals_changed
+
+# 食事データの一括インポート・エクスポート
+# インポート・エクスポートとも一定件数ずつ処理し、全履歴をメモリに載せない。
+MEAL_IO_FIELDS = ['meal_type', 'food_name', 'date', 'calories', 'eaten_at']
+IMPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000
+MAX_IMPORT_ERRORS = 100  # 結果に含めるエラー行の上限（件数は全件数える）
+
+
+def iter_csv_rows(fileobj):
+    # ヘッダー行つきの CSV を1行ずつ (行番号, dict) で返す
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    finally:
+        # 読み終えても元のファイルは閉じない（check_file の後に読み直す）
+        text.detach()
+
+
+def iter_jsonl_rows(fileobj):
+    # JSON Lines を1行ずつ (行番号, dict) で返す。壊れた行は None を返す
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig')
+    try:
+        for line_number, line in enumerate(text, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+    finally:
+        text.detach()
+
+
+def iter_rows(fileobj, file_format):
+    if file_format == 'csv':
+        return iter_csv_rows(fileobj)
+    if file_format == 'jsonl':
+        return iter_jsonl_rows(fileobj)
+    raise ValueError(f'未対応の形式です: {file_format}')
+
+
+def check_file(fileobj, file_format):
+    # 保存を始める前にファイル全体を読み、文字コードと CSV の形式を確かめる。
+    # 途中の行が Shift_JIS（Excel の保存形式）などでも、前半だけ保存されることがないようにする。
+    # 誤りがあれば {'error': ..., 'line': 行番号} を返す
+    try:
+        # UTF-8 では改行のバイトが複数バイト文字の途中に現れないので、行ごとに確かめれば行番号が正確になる
+        for line_number, line in enumerate(fileobj, start=1):
+            try:
+                line.decode('utf-8')
+            except UnicodeDecodeError:
+                return {'error': 'UTF-8 として読み取れない行があります。UTF-8 で保存し直してください。', 'line': line_number}
+        if file_format == 'csv':
+            fileobj.seek(0)
+            line_number = 0
+            try:
+                for line_number, row in iter_csv_rows(fileobj):
+                    pass
+            except csv.Error as e:
+                return {'error': f'CSV の形式が正しくありません: {e}', 'line': line_number + 1}
+    finally:
+        fileobj.seek(0)
+    return None
+
+
+def guess_format(filename):
+    if filename.lower().endswith('.csv'):
+        return 'csv'
+    if filename.lower().endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return None
+
+
+def save_meals(user, meals):
+    # bulk_create で一括保存し、シグナルの代わりに日別集計・キャッシュ・よく食べる食品をまとめて更新する
+    with transaction.atomic():
+        Meal.objects.bulk_create(meals)
+        meals_changed(user.pk, {meal.date for meal in meals})
+        FoodFrequency.objects.record(user.pk, meals)
+
+
+def save_meal_forms(user, forms):
+    # 検証済みの MealForm をまとめて保存し、対象日ごとの目標カロリーとの比較を返す
+    meals = []
+    for form in forms:
+        meal = form.save(commit=False)
+        meal.user = user
+        meals.append(meal)
+    save_meals(user, meals)
+    return day_statuses(user, {meal.date for meal in meals})
+
+
+def save_meal_edit(form):
+    # 編集フォームを保存し、変更された項目を編集履歴に残す
+    # form.initial は編集前の値（フォーム作成時にインスタンスから作られる）なので、保存後に読み直す必要はない
+    with transaction.atomic():
+        meal = form.save()
+        revision = MealRevision.objects.record(meal, form.initial)
+    return meal, revision
+
+
+def day_statuses(user, dates):
+    # 日別集計から対象日の合計を1回のクエリで読み、目標カロリーと比べる
+    target_calories = user.profile.target_calories
+    totals = dict(
+        DailyCalorieTotal.objects.filter(user=user, date__in=dates).values_list('date', 'total')
+    )
+    return [
+        {
+            'date': day,
+            'total_calories': totals.get(day, 0),
+            'target_calories': target_calories,
+            'over_target': totals.get(day, 0) > target_calories,
+        }
+        for day in sorted(dates)
+    ]
+
+
+def import_meals(user, rows, batch_size=IMPORT_BATCH_SIZE):
+    # MealForm と同じ検証を行い、batch_size 件ごとに1トランザクションで保存する
+    # ファイル自体の誤りは check_file で先に調べるが、読み取り中に見つかった場合は読み込みをやめ、
+    # それまでに保存した件数 (created) と一緒に file_error で返す
+    result = {'created': 0, 'error_count': 0, 'errors': []}
+    batch = []
+    line_number = 0
+    try:
+        for line_number, row in rows:
+            form = MealForm(data=row) if row is not None else None
+            if form is None or not form.is_valid():
+                result['error_count'] += 1
+                if len(result['errors']) < MAX_IMPORT_ERRORS:
+                    errors = {'__all__': ['行を読み取れません。']} if form is None else {
+                        field: [str(error) for error in field_errors]
+                        for field, field_errors in form.errors.items()
+                    }
+                    result['errors'].append({'line': line_number, 'errors': errors})
+                continue
+
+            meal = form.save(commit=False)
+            meal.user = user
+            batch.append(meal)
+            if len(batch) >= batch_size:
+                save_meals(user, batch)
+                result['created'] += len(batch)
+                batch = []
+    except (UnicodeDecodeError, csv.Error) as e:
+        result['error_count'] += 1
+        result['file_error'] = {
+            'error': f'{line_number + 1} 行目付近でファイルを読み取れないため、読み込みを中断しました ({e})。'
+                     f'それまでの {result["created"]} 件は保存済みです。',
+            'line': line_number + 1,
+        }
+        return result
+
+    if batch:
+        save_meals(user, batch)
+        result['created'] += len(batch)
+    return result
+
+
+def iter_user_meals(user, chunk_size=EXPORT_CHUNK_SIZE):
+    # 主キーの範囲で区切って読み込む（MySQL のドライバは iterator() でも結果全体を受信するため）
+    last_pk = 0
+    while True:
+        chunk = list(
+            Meal.objects.filter(user=user, pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', *MEAL_IO_FIELDS)[:chunk_size]
+        )
+        if not chunk:
+            return
+        for pk, *values in chunk:
+            yield dict(zip(MEAL_IO_FIELDS, values))
+        last_pk = chunk[-1][0]
+
+
+class _Echo:
+    # csv.writer の書き込み先。書いた内容をそのまま返す
+    def write(self, value):
+        return value
+
+
+def export_csv(user):
+    writer = csv.writer(_Echo())
+    yield '\ufeff' + writer.writerow(MEAL_IO_FIELDS)
+    for meal in iter_user_meals(user):
+        yield writer.writerow([
+            meal['meal_type'],
+            meal['food_name'],
+            meal['date'].isoformat(),
+            meal['calories'],
+            meal['eaten_at'].isoformat(),
+        ])
+
+
+def export_jsonl(user):
+    for meal in iter_user_meals(user):
+        meal['date'] = meal['date'].isoformat()
+        meal['eaten_at'] = meal['eaten_at'].isoformat()
+        yield json.dumps(meal, ensure_ascii=False) + '\n'
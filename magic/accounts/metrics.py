@@ -0,0 +1,82 @@
+import bisect
+import threading
+
+# ビューごとの処理時間・SQL の計測値をプロセス内のヒストグラムに集計し、
+# Prometheus のテキスト形式で出力する
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最後は +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class _ViewMetrics:
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.sql_queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.sql_duration = Histogram(DURATION_BUCKETS)
+        self.duplicate_queries = 0
+
+
+METRICS = [
+    ('accounts_view_duration_seconds', 'histogram', 'ビューの処理時間', lambda m: m.duration),
+    ('accounts_view_sql_queries', 'histogram', '1リクエストあたりの SQL 発行数', lambda m: m.sql_queries),
+    ('accounts_view_sql_duration_seconds', 'histogram', '1リクエストあたりの SQL 実行時間', lambda m: m.sql_duration),
+]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, duration, stats):
+        with self._lock:
+            metrics = self._views.get(view)
+            if metrics is None:
+                metrics = self._views[view] = _ViewMetrics()
+            metrics.duration.observe(duration)
+            metrics.sql_queries.observe(stats.queries)
+            metrics.sql_duration.observe(stats.duration)
+            metrics.duplicate_queries += stats.duplicates
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def render(self):
+        with self._lock:
+            views = sorted(self._views.items())
+            lines = []
+            for name, kind, help_text, get in METRICS:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for view, metrics in views:
+                    lines.extend(get(metrics).lines(name, f'view="{view}"'))
+            lines.append('# HELP accounts_view_duplicate_queries_total 同じ SQL の重複実行回数（N+1 の検出用）')
+            lines.append('# TYPE accounts_view_duplicate_queries_total counter')
+            for view, metrics in views:
+                lines.append(f'accounts_view_duplicate_queries_total{{view="{view}"}} {metrics.duplicate_queries}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,220 @@
+import logging
+import mimetypes
+import os
+import posixpath
+import random
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import http_date, quote_etag
+
+from .instrumentation import capture_queries
+from .metrics import registry
+from .routers import pin_to_primary
+
+logger = logging.getLogger('accounts')
+
+SESSION_REFRESHED_AT_KEY = '_session_refreshed_at'
+
+
+# セッションの書き込みを減らすミドルウェア
+# SESSION_SAVE_EVERY_REQUEST の代わりに使う。セッションの内容が変わったときと、
+# 前回の保存から SESSION_REFRESH_INTERVAL 秒以上たって有効期限を延ばす必要があるときだけ保存する。
+class SessionRefreshMiddleware(SessionMiddleware):
+    def process_response(self, request, response):
+        session = getattr(request, 'session', None)
+        if session is not None and session.accessed and not session.is_empty():
+            now = int(time.time())
+            if session.modified or now - session.get(SESSION_REFRESHED_AT_KEY, 0) >= settings.SESSION_REFRESH_INTERVAL:
+                session[SESSION_REFRESHED_AT_KEY] = now
+        return super().process_response(request, response)
+
+
+# 書き込みのリクエスト (POST など) を送ったユーザーを、しばらくプライマリから読ませるミドルウェア (accounts.routers)
+# 食事の登録・編集・削除やプロフィールの変更の直後に、遅れているレプリカから古い内容を読まないようにする。
+# セッションを保存する SessionRefreshMiddleware と、request.user を用意する AuthenticationMiddleware より後に置く。
+class ReplicaPinMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        user = getattr(request, 'user', None)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and user is not None and user.is_authenticated:
+            pin_to_primary(request)
+        return response
+
+
+# ビューごとの処理時間と SQL を計測するミドルウェア
+# 計測結果は accounts.metrics に集計され、metrics/ で Prometheus 形式で参照できる。
+# METRICS_SAMPLE_RATE の割合のリクエストだけ SQL を計測する（0 で無効）。
+# ASGI の非同期ビューでも使えるよう、同期・非同期の両方に対応する。
+class QueryMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            response = self.get_response(request)
+            return self.add_timing(response, start)
+
+        with capture_queries(count_rows=False) as stats:
+            response = self.get_response(request)
+        return self.record(request, response, start, stats)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            response = await self.get_response(request)
+            return self.add_timing(response, start)
+
+        # 非同期 ORM や同期ビューの SQL はリクエストごとのスレッドで実行されるので、
+        # 計測用のラッパーもそのスレッドの接続に取り付ける
+        stack = ExitStack()
+        stats = await sync_to_async(stack.enter_context)(capture_queries(count_rows=False))
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.record(request, response, start, stats)
+
+    def add_timing(self, response, start):
+        response['Server-Timing'] = f'app;dur={(time.perf_counter() - start) * 1000:.1f}'
+        return response
+
+    def record(self, request, response, start, stats):
+        duration = time.perf_counter() - start
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name or match.view_name if match else 'unresolved'
+        registry.observe(view, duration, stats)
+        response['Server-Timing'] = (
+            f'app;dur={duration * 1000:.1f}, '
+            f'db;dur={stats.duration * 1000:.1f};desc="{stats.queries} queries"'
+        )
+        if duration * 1000 >= settings.METRICS_SLOW_REQUEST_MS:
+            logger.warning(
+                f'Slow request: {view} {duration * 1000:.0f}ms, '
+                f'{stats.queries} queries ({stats.duplicates} duplicates)'
+            )
+        return response
+
+
+def _encoding_qualities(accept_encoding):
+    # Accept-Encoding の項目ごとの q 値 ({'gzip': 1.0, 'br': 0.0, ...})。q を省略した項目は 1
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    return qualities
+
+
+# 配信する静的ファイル1つ分（圧縮版のパスと応答ヘッダーを最初に1回だけ用意する）
+class _StaticAsset:
+    ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+    def __init__(self, path, immutable):
+        stat = os.stat(path)
+        self.path = path
+        self.last_modified = int(stat.st_mtime)
+        self.etag = quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.cache_control = (
+            f'public, max-age={settings.STATIC_ASSET_MAX_AGE}, immutable' if immutable else 'public, no-cache'
+        )
+        self.encodings = [
+            (encoding, path + extension) for encoding, extension in self.ENCODINGS if os.path.isfile(path + extension)
+        ]
+
+    def response(self, request):
+        response = get_conditional_response(request, etag=self.etag, last_modified=self.last_modified)
+        if response is None:
+            path, encoding = self.path, None
+            qualities = _encoding_qualities(request.headers.get('Accept-Encoding', ''))
+            for name, compressed_path in self.encodings:
+                # q=0 は拒否。名前がなければ * の値に従う
+                if qualities.get(name, qualities.get('*', 0)) > 0:
+                    path, encoding = compressed_path, name
+                    break
+            with open(path, 'rb') as f:
+                response = HttpResponse(f.read() if request.method == 'GET' else b'', content_type=self.content_type)
+            if encoding:
+                response['Content-Encoding'] = encoding
+            response['Content-Length'] = os.path.getsize(path)
+        response['ETag'] = self.etag
+        response['Last-Modified'] = http_date(self.last_modified)
+        response['Cache-Control'] = self.cache_control
+        if self.encodings:
+            response['Vary'] = 'Accept-Encoding'
+        return response
+
+
+# STATIC_ROOT の静的ファイルをアプリケーション内で配信するミドルウェア
+# collectstatic（accounts.storage）で作ったハッシュ付きのファイルは内容が変わらないので、
+# ブラウザが再検証しないよう1年間 immutable でキャッシュさせる。圧縮版 (.br/.gz) があればそちらを返す。
+# セキュリティのヘッダー (X-Content-Type-Options など) は付けたまま、セッションの読み込みなどは通さないよう、
+# MIDDLEWARE の SecurityMiddleware の直後に置く。
+class StaticAssetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else f'/{settings.STATIC_URL}'
+        self.root = settings.STATIC_ROOT
+        self.assets = {}
+        self.hashed_names = None
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        asset = self.find(request)
+        if iscoroutinefunction(self):
+            return self.__acall__(request, asset)
+        if asset is None:
+            return self.get_response(request)
+        return asset.response(request)
+
+    async def __acall__(self, request, asset):
+        # ファイルは小さいので、読み込みはそのまま行う
+        if asset is None:
+            return await self.get_response(request)
+        return asset.response(request)
+
+    def find(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefix) or not self.root:
+            return None
+        name = posixpath.normpath(request.path[len(self.prefix):]).lstrip('/')
+        if name in self.assets:
+            return self.assets[name]
+        if name.startswith('..') or name.endswith(('.gz', '.br')):
+            return None
+        path = os.path.join(self.root, *name.split('/'))
+        if not os.path.isfile(path):
+            return None
+        if self.hashed_names is None:
+            # staticfiles.json のハッシュ付きの名前だけを immutable にする
+            self.hashed_names = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+        asset = _StaticAsset(path, name in self.hashed_names)
+        self.assets[name] = asset
+        return asset
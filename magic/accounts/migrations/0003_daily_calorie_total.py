@@ -0,0 +1,91 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+
+
+def backfill_daily_totals(apps, schema_editor):
+    Meal = apps.get_model("accounts", "Meal")
+    DailyCalorieTotal = apps.get_model("accounts", "DailyCalorieTotal")
+    rows = (
+        Meal.objects.order_by()
+        .values("user_id", "date", "meal_type")
+        .annotate(total=Sum("calories"), meal_count=Count("id"))
+    )
+    totals = {}
+    for row in rows.iterator():
+        entry = totals.setdefault(
+            (row["user_id"], row["date"]),
+            {"total": 0, "meal_count": 0, "by_meal_type": {}},
+        )
+        entry["total"] += row["total"]
+        entry["meal_count"] += row["meal_count"]
+        entry["by_meal_type"][row["meal_type"]] = row["total"]
+    DailyCalorieTotal.objects.bulk_create(
+        [
+            DailyCalorieTotal(user_id=user_id, date=day, **values)
+            for (user_id, day), values in totals.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("accounts", "0002_alter_meal_eaten_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyCalorieTotal",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="日付")),
+                ("total", models.IntegerField(default=0, verbose_name="合計カロリー")),
+                (
+                    "meal_count",
+                    models.PositiveIntegerField(default=0, verbose_name="食事回数"),
+                ),
+                (
+                    "by_meal_type",
+                    models.JSONField(default=dict, verbose_name="食事の種類別カロリー"),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_totals",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="ユーザー",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "日別カロリー集計",
+                "verbose_name_plural": "日別カロリー集計",
+                "ordering": ["date"],
+            },
+        ),
+        migrations.DeleteModel(
+            name="TotalCalories",
+        ),
+        migrations.AddConstraint(
+            model_name="dailycalorietotal",
+            constraint=models.UniqueConstraint(
+                fields=("user", "date"), name="unique_daily_total_per_user_date"
+            ),
+        ),
+        migrations.RunPython(backfill_daily_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_daily_calorie_total"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="meal",
+            index=models.Index(
+                fields=["user", "date", "eaten_at"], name="meal_user_date_eaten_idx"
+            ),
+        ),
+    ]
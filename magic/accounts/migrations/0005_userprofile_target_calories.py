@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:19
+
+from django.db import migrations, models
+
+# 移行時点の目標カロリーの表
+TARGET_CALORIE_RULES = {
+    "M": [(30, 2400), (50, 2200), (None, 2000)],
+    "F": [(30, 2000), (50, 1800), (None, 1600)],
+}
+
+
+def populate_target_calories(apps, schema_editor):
+    UserProfile = apps.get_model("accounts", "UserProfile")
+    for profile in UserProfile.objects.only("age", "gender").iterator():
+        rules = TARGET_CALORIE_RULES.get(profile.gender, TARGET_CALORIE_RULES["F"])
+        for max_age, calories in rules:
+            if max_age is None or profile.age <= max_age:
+                profile.target_calories = calories
+                break
+        profile.save(update_fields=["target_calories"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0004_meal_user_date_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userprofile",
+            name="target_calories",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="目標カロリー"
+            ),
+        ),
+        migrations.AddField(
+            model_name="userprofile",
+            name="target_calories_override",
+            field=models.PositiveIntegerField(
+                blank=True, null=True, verbose_name="目標カロリー（個別設定）"
+            ),
+        ),
+        migrations.RunPython(populate_target_calories, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:19
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0005_userprofile_target_calories"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="meal",
+            options={
+                "ordering": ["-date", "-eaten_at", "-id"],
+                "verbose_name": "食事",
+                "verbose_name_plural": "食事",
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0006_meal_ordering_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FoodItem",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        max_length=100, unique=True, verbose_name="食品名"
+                    ),
+                ),
+                (
+                    "reading",
+                    models.CharField(
+                        blank=True,
+                        help_text="ひらがな・カタカナでの読み（漢字の食品名を読みで検索するため）",
+                        max_length=100,
+                        verbose_name="読み",
+                    ),
+                ),
+                (
+                    "calories_per_100g",
+                    models.PositiveIntegerField(
+                        blank=True, null=True, verbose_name="100gあたりのカロリー"
+                    ),
+                ),
+                (
+                    "serving_grams",
+                    models.PositiveIntegerField(
+                        blank=True, null=True, verbose_name="1食分の量 (g)"
+                    ),
+                ),
+                (
+                    "calories_per_serving",
+                    models.PositiveIntegerField(
+                        blank=True, null=True, verbose_name="1食分のカロリー"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "食品",
+                "verbose_name_plural": "食品",
+                "ordering": ["name"],
+            },
+        ),
+    ]
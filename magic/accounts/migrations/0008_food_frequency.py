@@ -0,0 +1,104 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import datetime
+import math
+
+
+def backfill_food_frequencies(apps, schema_editor):
+    # accounts.models.FoodFrequencyManager.record と同じ計算（基準日は FREQUENT_FOODS_EPOCH）
+    Meal = apps.get_model("accounts", "Meal")
+    FoodFrequency = apps.get_model("accounts", "FoodFrequency")
+    epoch = datetime.date(2020, 1, 1).toordinal()
+    half_life = settings.FREQUENT_FOODS_HALF_LIFE_DAYS
+    rows = Meal.objects.order_by("date", "eaten_at", "id").values_list(
+        "user_id", "food_name", "meal_type", "calories", "date"
+    )
+    entries = {}
+    for user_id, food_name, meal_type, calories, day in rows.iterator():
+        weight = (day.toordinal() - epoch) / half_life
+        entry = entries.get((user_id, food_name))
+        if entry is None:
+            entry = entries[(user_id, food_name)] = FoodFrequency(
+                user_id=user_id, food_name=food_name, count=0, score=weight
+            )
+        else:
+            high, low = max(entry.score, weight), min(entry.score, weight)
+            entry.score = high + math.log2(1 + 2 ** (low - high))
+        entry.count += 1
+        entry.meal_type = meal_type
+        entry.calories = calories
+        entry.last_eaten = day
+    FoodFrequency.objects.bulk_create(entries.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("accounts", "0007_food_item"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FoodFrequency",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "food_name",
+                    models.CharField(max_length=100, verbose_name="食事内容"),
+                ),
+                (
+                    "meal_type",
+                    models.CharField(
+                        choices=[
+                            ("breakfast", "朝食"),
+                            ("lunch", "昼食"),
+                            ("dinner", "夕食"),
+                        ],
+                        max_length=10,
+                        verbose_name="食事の種類",
+                    ),
+                ),
+                ("calories", models.IntegerField(verbose_name="カロリー")),
+                ("count", models.PositiveIntegerField(default=0, verbose_name="回数")),
+                ("last_eaten", models.DateField(verbose_name="最後に食べた日")),
+                ("score", models.FloatField(verbose_name="スコア")),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="food_frequencies",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="ユーザー",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "よく食べる食品",
+                "verbose_name_plural": "よく食べる食品",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "-score"], name="food_freq_user_score_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="foodfrequency",
+            constraint=models.UniqueConstraint(
+                fields=("user", "food_name"), name="unique_food_frequency_per_user_food"
+            ),
+        ),
+        migrations.RunPython(backfill_food_frequencies, migrations.RunPython.noop),
+    ]
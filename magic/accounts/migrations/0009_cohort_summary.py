@@ -0,0 +1,64 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0008_food_frequency"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CohortSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("period_start", models.DateField(verbose_name="集計開始日")),
+                ("period_end", models.DateField(verbose_name="集計終了日")),
+                ("age_band", models.CharField(max_length=20, verbose_name="年齢層")),
+                (
+                    "gender",
+                    models.CharField(blank=True, max_length=1, verbose_name="性別"),
+                ),
+                ("users", models.PositiveIntegerField(verbose_name="ユーザー数")),
+                (
+                    "logged_days",
+                    models.PositiveIntegerField(verbose_name="記録のある日数"),
+                ),
+                (
+                    "average_daily_calories",
+                    models.FloatField(verbose_name="1日あたりの平均カロリー"),
+                ),
+                (
+                    "over_target_days",
+                    models.PositiveIntegerField(verbose_name="目標超過の日数"),
+                ),
+                ("over_target_share", models.FloatField(verbose_name="目標超過の割合")),
+                (
+                    "built_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="作成日時"),
+                ),
+            ],
+            options={
+                "verbose_name": "コホート集計",
+                "verbose_name_plural": "コホート集計",
+                "ordering": ["-period_end", "age_band", "gender"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="cohortsummary",
+            constraint=models.UniqueConstraint(
+                fields=("period_end", "age_band", "gender"),
+                name="unique_cohort_summary",
+            ),
+        ),
+    ]
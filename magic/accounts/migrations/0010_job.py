@@ -0,0 +1,107 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("accounts", "0009_cohort_summary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Job",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, verbose_name="処理名")),
+                ("payload", models.JSONField(default=dict, verbose_name="引数")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "待機中"),
+                            ("running", "実行中"),
+                            ("succeeded", "完了"),
+                            ("failed", "失敗"),
+                        ],
+                        default="queued",
+                        max_length=10,
+                        verbose_name="状態",
+                    ),
+                ),
+                ("progress", models.JSONField(default=dict, verbose_name="進捗")),
+                (
+                    "result",
+                    models.JSONField(blank=True, null=True, verbose_name="結果"),
+                ),
+                ("error", models.TextField(blank=True, verbose_name="エラー")),
+                (
+                    "attempts",
+                    models.PositiveIntegerField(default=0, verbose_name="試行回数"),
+                ),
+                (
+                    "max_attempts",
+                    models.PositiveIntegerField(default=3, verbose_name="最大試行回数"),
+                ),
+                (
+                    "run_after",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="実行予定日時"
+                    ),
+                ),
+                (
+                    "locked_by",
+                    models.CharField(
+                        blank=True, max_length=100, verbose_name="実行中のワーカー"
+                    ),
+                ),
+                (
+                    "locked_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="実行開始日時"
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="終了日時"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="jobs",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="依頼したユーザー",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "バックグラウンド処理",
+                "verbose_name_plural": "バックグラウンド処理",
+                "indexes": [
+                    models.Index(
+                        fields=["status", "run_after"], name="job_status_run_after_idx"
+                    )
+                ],
+            },
+        ),
+    ]
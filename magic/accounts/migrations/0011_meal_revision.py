@@ -0,0 +1,59 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:50
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0010_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MealRevision",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "changes",
+                    models.JSONField(
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                        verbose_name="変更内容",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="変更日時"),
+                ),
+                (
+                    "meal",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="revisions",
+                        to="accounts.meal",
+                        verbose_name="食事",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "食事の編集履歴",
+                "verbose_name_plural": "食事の編集履歴",
+                "indexes": [
+                    models.Index(
+                        fields=["meal", "created_at"],
+                        name="meal_revision_meal_created_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,17 +1,90 @@
-from django.db import models
+import datetime
+import math
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, models, router, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.conf import settings
+
+def _upsert_unique_fields(model, fields):
+    # bulk_create(update_conflicts=True) の対象の列。MySQL (ON DUPLICATE KEY UPDATE) は指定できない
+    if connections[router.db_for_write(model)].features.supports_update_conflicts_with_target:
+        return fields
+    return None
+
+
+# よく食べる食品のスコアの基準日（変更すると既存のスコアと比較できなくなる）
+FREQUENT_FOODS_EPOCH = datetime.date(2020, 1, 1)
+
+# 目標カロリーの表（性別ごとに (年齢の上限, 目標カロリー) を年齢の低い順に並べる。上限 None はそれ以上すべて）
+TARGET_CALORIE_RULES = {
+    'M': [(30, 2400), (50, 2200), (None, 2000)],
+    'F': [(30, 2000), (50, 1800), (None, 1600)],
+}
+
+
+# カロリー計算式
+def resolve_target_calories(age, gender):
+    rules = TARGET_CALORIE_RULES.get(gender, TARGET_CALORIE_RULES['F'])  # 男性以外は女性の表を使う
+    for max_age, calories in rules:
+        if max_age is None or age <= max_age:
+            return calories
+
+
+def age_bands():
+    # 目標カロリーの表と同じ年齢の区分（例: 0〜30歳, 31〜50歳, 51歳〜）
+    bands = []
+    lower = 0
+    for max_age, _ in TARGET_CALORIE_RULES['M']:
+        if max_age is None:
+            bands.append((max_age, f'{lower}歳〜'))
+        else:
+            bands.append((max_age, f'{lower}〜{max_age}歳'))
+            lower = max_age + 1
+    return bands
+
+
+def age_band(age):
+    for max_age, label in age_bands():
+        if max_age is None or age <= max_age:
+            return label
+
+
 # プロフィール
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     age = models.PositiveIntegerField(default=0,verbose_name='年齢')
     gender = models.CharField(max_length=1, choices=[('M', '男性'), ('F', '女性')], verbose_name='性別')
+    # 目標カロリーは保存時に計算しておく（個別設定があればそちらを優先）
+    target_calories = models.PositiveIntegerField(default=0, editable=False, verbose_name='目標カロリー')
+    target_calories_override = models.PositiveIntegerField(null=True, blank=True, verbose_name='目標カロリー（個別設定）')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     def __str__(self):
         return f"{self.user.username} - {self.gender} - Age: {self.age}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 目標カロリーの変更を検知するため、読み込み時の値を覚えておく
+        instance._loaded_target_calories = instance.__dict__.get('target_calories')
+        return instance
+
+    def compute_target_calories(self):
+        if self.target_calories_override:
+            return self.target_calories_override
+        return resolve_target_calories(self.age, self.gender)
+
+    def save(self, *args, **kwargs):
+        self.target_calories = self.compute_target_calories()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'age', 'gender', 'target_calories_override'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'target_calories'}
+        super().save(*args, **kwargs)
+
 # 食事
 class Meal(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='ユーザー')
@@ -32,10 +105,22 @@ class Meal(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.food_name} - {self.calories} kcal "
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 日付の移動を集計に反映するため、読み込み時の値を覚えておく
+        instance._loaded_user_id = instance.__dict__.get('user_id')
+        instance._loaded_date = instance.__dict__.get('date')
+        return instance
+
     class Meta:
-        ordering = ['-date', '-eaten_at']
+        ordering = ['-date', '-eaten_at', '-id']
         verbose_name = '食事'
         verbose_name_plural = '食事'
+        indexes = [
+            # ユーザー＋日付での絞り込みと ordering の並び順をインデックスだけで処理する
+            models.Index(fields=['user', 'date', 'eaten_at'], name='meal_user_date_eaten_idx'),
+        ]
 
 
 
@@ -44,11 +129,194 @@ class Food(models.Model):
     name = models.CharField(max_length=100, verbose_name='食事内容')
 
 
-class TotalCalories(models.Model):
-    total = models.IntegerField(default=0)  # 合計カロリーを表すフィールド
+# 食品カタログ（食事入力時の検索とカロリーの自動入力に使う）
+# 検索は accounts.food_search のメモリ上の索引で行う
+class FoodItem(models.Model):
+    name = models.CharField(max_length=100, unique=True, verbose_name='食品名')
+    reading = models.CharField(max_length=100, blank=True, verbose_name='読み', help_text='ひらがな・カタカナでの読み（漢字の食品名を読みで検索するため）')
+    calories_per_100g = models.PositiveIntegerField(null=True, blank=True, verbose_name='100gあたりのカロリー')
+    serving_grams = models.PositiveIntegerField(null=True, blank=True, verbose_name='1食分の量 (g)')
+    calories_per_serving = models.PositiveIntegerField(null=True, blank=True, verbose_name='1食分のカロリー')
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        if self.calories_per_100g is None and self.calories_per_serving is None:
+            raise ValidationError('100gあたりか1食分のどちらかのカロリーを入力してください。')
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = '食品'
+        verbose_name_plural = '食品'
+
+
+# 日別カロリー集計
+class DailyCalorieTotalManager(models.Manager):
+    def total_for(self, user, day):
+        # 1日分の合計カロリーを集計行から取得する
+        total = self.filter(user=user, date=day).values_list('total', flat=True).first()
+        return total or 0
+
+    async def atotal_for(self, user, day):
+        total = await self.filter(user=user, date=day).values_list('total', flat=True).afirst()
+        return total or 0
+
+    def refresh(self, user_id, dates):
+        # 指定した日付の集計行を Meal テーブルから作り直す（1日あたり数行の集計で済む）
+        date_field = Meal._meta.get_field('date')
+        dates = {date_field.to_python(day) for day in dates if day}
+        if not dates:
+            return
+
+        with transaction.atomic():
+            # 対象日の食事をロックして読む（同じ日を同時に更新するリクエストは順番に、最新の食事から集計する）。
+            # 対象日の食事は数件なので、GROUP BY の一時テーブルを避けてインデックス検索の結果をその場で集計する
+            rows = (
+                Meal.objects.select_for_update().filter(user_id=user_id, date__in=dates)
+                .order_by()
+                .values_list('date', 'meal_type', 'calories')
+            )
+            totals = {}
+            for day, meal_type, calories in rows:
+                entry = totals.setdefault(day, {'total': 0, 'meal_count': 0, 'by_meal_type': {}})
+                entry['total'] += calories
+                entry['meal_count'] += 1
+                entry['by_meal_type'][meal_type] = entry['by_meal_type'].get(meal_type, 0) + calories
+
+            # 食事がなくなった日は集計行ごと削除する
+            empty_dates = dates - totals.keys()
+            if empty_dates:
+                self.filter(user_id=user_id, date__in=empty_dates).delete()
+
+            # 集計行は upsert する（その日の最初の食事を同時に追加しても一意制約の違反にならない）
+            if totals:
+                self.bulk_create(
+                    [self.model(user_id=user_id, date=day, **values) for day, values in totals.items()],
+                    update_conflicts=True,
+                    unique_fields=_upsert_unique_fields(self.model, ['user', 'date']),
+                    update_fields=['total', 'meal_count', 'by_meal_type'],
+                )
+
+    def rebuild(self, user_id):
+        # ユーザーの全期間の集計行を作り直す
+        self.filter(user_id=user_id).delete()
+        dates = Meal.objects.filter(user_id=user_id).order_by().values_list('date', flat=True).distinct()
+        self.refresh(user_id, list(dates))
+
+
+class DailyCalorieTotal(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_totals', verbose_name='ユーザー')
+    date = models.DateField(verbose_name='日付')
+    total = models.IntegerField(default=0, verbose_name='合計カロリー')
+    meal_count = models.PositiveIntegerField(default=0, verbose_name='食事回数')
+    by_meal_type = models.JSONField(default=dict, verbose_name='食事の種類別カロリー')
+
+    objects = DailyCalorieTotalManager()
+
+    def __str__(self):
+        return f"{self.user_id} - {self.date} - {self.total} kcal"
+
+    class Meta:
+        ordering = ['date']
+        verbose_name = '日別カロリー集計'
+        verbose_name_plural = '日別カロリー集計'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_daily_total_per_user_date'),
+        ]
+
+# よく食べる食品（ユーザー・食品名ごとの減衰つき回数）
+# 食事を登録するたびに該当する行だけを更新し、一覧は score の高い順に読むだけで済むようにする。
+# score は 2 を底とした対数で、基準日から半減期ごとに 1 増える重みを食事ごとに足し合わせた値。
+# 基準日からの経過で全員の重みが同じように増えるので、古い行を更新しなくても新しさの順に並ぶ。
+class FoodFrequencyManager(models.Manager):
+    def record(self, user_id, meals):
+        # 追加した食事を集計に反映する（同じ食品が複数あってもクエリは 3 回）
+        latest = {}
+        weights = {}
+        for meal in meals:
+            name = meal.food_name
+            weights[name] = _add_log2(weights.get(name), food_frequency_weight(meal.date))
+            if name not in latest or meal.date >= latest[name].date:
+                latest[name] = meal
+        if not latest:
+            return
+
+        with transaction.atomic():
+            # まだない食品の行を count=0 で作る。同じ食品を別のリクエストが同時に初めて記録しても
+            # 一意制約の違反にせず、既存の行は何も変えない（更新するのは同じ値の food_name だけ）
+            self.bulk_create(
+                [
+                    self.model(
+                        user_id=user_id, food_name=name, count=0, score=weights[name],
+                        last_eaten=meal.date, calories=meal.calories, meal_type=meal.meal_type,
+                    )
+                    for name, meal in latest.items()
+                ],
+                update_conflicts=True,
+                unique_fields=_upsert_unique_fields(self.model, ['user', 'food_name']),
+                update_fields=['food_name'],
+            )
+            counts = Counter(meal.food_name for meal in meals)
+            rows = list(self.select_for_update().filter(user_id=user_id, food_name__in=latest.keys()))
+            for row in rows:
+                meal = latest[row.food_name]
+                # count=0 の行はこのトランザクションで作ったもの（他のリクエストの行はコミット前に count を増やしている）
+                if row.count:
+                    row.score = _add_log2(row.score, weights[row.food_name])
+                row.count += counts[row.food_name]
+                # カロリーと食事の種類は、いちばん新しい食事のものを使う
+                if meal.date >= row.last_eaten:
+                    row.last_eaten = meal.date
+                    row.calories = meal.calories
+                    row.meal_type = meal.meal_type
+            self.bulk_update(rows, ['score', 'count', 'last_eaten', 'calories', 'meal_type'])
+
+    def top(self, user, limit):
+        return self.filter(user=user).order_by('-score')[:limit]
+
+
+def food_frequency_weight(day):
+    # 基準日 (FREQUENT_FOODS_EPOCH) からの経過日数を半減期で割った値（2 を底とした対数の重み）
+    return (_date_ordinal(day) - FREQUENT_FOODS_EPOCH.toordinal()) / settings.FREQUENT_FOODS_HALF_LIFE_DAYS
+
+
+def _date_ordinal(day):
+    return Meal._meta.get_field('date').to_python(day).toordinal()
+
+
+def _add_log2(a, b):
+    # log2(2**a + 2**b) を桁あふれせずに計算する
+    if a is None:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+class FoodFrequency(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='food_frequencies', verbose_name='ユーザー')
+    food_name = models.CharField(max_length=100, verbose_name='食事内容')
+    meal_type = models.CharField(max_length=10, choices=Meal.MEAL_TYPES, verbose_name='食事の種類')
+    calories = models.IntegerField(verbose_name='カロリー')
+    count = models.PositiveIntegerField(default=0, verbose_name='回数')
+    last_eaten = models.DateField(verbose_name='最後に食べた日')
+    score = models.FloatField(verbose_name='スコア')
+
+    objects = FoodFrequencyManager()
 
     def __str__(self):
-        return f"Total Calories: {self.total}"
+        return f"{self.user_id} - {self.food_name} ({self.count})"
+
+    class Meta:
+        verbose_name = 'よく食べる食品'
+        verbose_name_plural = 'よく食べる食品'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'food_name'], name='unique_food_frequency_per_user_food'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-score'], name='food_freq_user_score_idx'),
+        ]
+
 
 class RelatedData(models.Model):
     meal = models.ForeignKey(Meal, on_delete=models.CASCADE, related_name='related_data')
@@ -58,12 +326,103 @@ class RelatedData(models.Model):
         return self.additional_info
 
 
+class MealRevisionManager(models.Manager):
+    def record(self, meal, before):
+        # 変更前の値 (before) と保存後の meal を比べ、変わった項目だけを {項目: [変更前, 変更後]} で残す
+        changes = {
+            field: [before.get(field), getattr(meal, field)]
+            for field in MealRevision.TRACKED_FIELDS
+            if before.get(field) != getattr(meal, field)
+        }
+        if not changes:
+            return None
+        return self.create(meal=meal, changes=changes)
 
 
+# 食事の編集履歴（変更された項目の差分だけを保存する）
+class MealRevision(models.Model):
+    TRACKED_FIELDS = ['meal_type', 'food_name', 'calories', 'eaten_at', 'date']
+    meal = models.ForeignKey(Meal, on_delete=models.CASCADE, related_name='revisions', verbose_name='食事')
+    changes = models.JSONField(encoder=DjangoJSONEncoder, verbose_name='変更内容')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='変更日時')
 
+    objects = MealRevisionManager()
 
+    def __str__(self):
+        return f"{self.meal_id} - {', '.join(self.changes)} ({self.created_at:%Y-%m-%d %H:%M})"
+
+    class Meta:
+        verbose_name = '食事の編集履歴'
+        verbose_name_plural = '食事の編集履歴'
+        indexes = [
+            # 食事ごとの履歴を新しい順に読む
+            models.Index(fields=['meal', 'created_at'], name='meal_revision_meal_created_idx'),
+        ]
 
 
+# 年齢層・性別ごとの摂取カロリーの集計（管理画面のレポート用）
+# 毎晩 build_cohort_summary コマンドで日別集計から作成する
+class CohortSummary(models.Model):
+    period_start = models.DateField(verbose_name='集計開始日')
+    period_end = models.DateField(verbose_name='集計終了日')
+    age_band = models.CharField(max_length=20, verbose_name='年齢層')
+    gender = models.CharField(max_length=1, blank=True, verbose_name='性別')
+    users = models.PositiveIntegerField(verbose_name='ユーザー数')
+    logged_days = models.PositiveIntegerField(verbose_name='記録のある日数')
+    average_daily_calories = models.FloatField(verbose_name='1日あたりの平均カロリー')
+    over_target_days = models.PositiveIntegerField(verbose_name='目標超過の日数')
+    over_target_share = models.FloatField(verbose_name='目標超過の割合')
+    built_at = models.DateTimeField(auto_now_add=True, verbose_name='作成日時')
 
+    def __str__(self):
+        return f"{self.period_end} - {self.age_band} - {self.gender or '未設定'}"
 
+    class Meta:
+        ordering = ['-period_end', 'age_band', 'gender']
+        verbose_name = 'コホート集計'
+        verbose_name_plural = 'コホート集計'
+        constraints = [
+            models.UniqueConstraint(fields=['period_end', 'age_band', 'gender'], name='unique_cohort_summary'),
+        ]
 
+
+# バックグラウンドで実行する処理（accounts.jobs と run_worker コマンドで実行する）
+# 外部のメッセージブローカーを使わず、このテーブルをキューとして使う。
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUSES = [
+        (QUEUED, '待機中'),
+        (RUNNING, '実行中'),
+        (SUCCEEDED, '完了'),
+        (FAILED, '失敗'),
+    ]
+    name = models.CharField(max_length=100, verbose_name='処理名')
+    payload = models.JSONField(default=dict, verbose_name='引数')
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED, verbose_name='状態')
+    # 分割して実行する処理の途中経過（次の実行はここから続ける）
+    progress = models.JSONField(default=dict, verbose_name='進捗')
+    result = models.JSONField(null=True, blank=True, verbose_name='結果')
+    error = models.TextField(blank=True, verbose_name='エラー')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='試行回数')
+    max_attempts = models.PositiveIntegerField(default=3, verbose_name='最大試行回数')
+    run_after = models.DateTimeField(default=timezone.now, verbose_name='実行予定日時')
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name='実行中のワーカー')
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name='実行開始日時')
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='jobs', verbose_name='依頼したユーザー')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='終了日時')
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+    class Meta:
+        verbose_name = 'バックグラウンド処理'
+        verbose_name_plural = 'バックグラウンド処理'
+        indexes = [
+            # ワーカーが次の処理を探すときに使う
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
@@ -0,0 +1,65 @@
+import functools
+import hashlib
+import logging
+import os
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.template.loader import get_template, render_to_string
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+logger = logging.getLogger('accounts')
+
+# 変数を使わない固定ページ（完了画面など）
+# 描画結果はテンプレート・URL 設定・静的ファイルの URL だけで決まるので、プロセスごとに1回だけ描画して使い回す。
+# テンプレートにユーザーごとの値・{% csrf_token %}・messages を追加したらここから外すこと
+STATIC_PAGES = [
+    'index.html',
+    'success.html',
+    'calorie_warning.html',
+    'update_complete.html',
+    'password_changed.html',
+    'logout_complete.html',
+    'delete_completed.html',
+    'registration/registration_complete.html',
+]
+
+
+@functools.lru_cache(maxsize=None)
+def _render_static_page(template_name):
+    content = render_to_string(template_name).encode()
+    return content, quote_etag(hashlib.md5(content).hexdigest())
+
+
+def static_page(request, template_name):
+    if not settings.TEMPLATE_CACHE:
+        # テンプレートを編集しながら確認するときは毎回描画する
+        return HttpResponse(render_to_string(template_name))
+    content, etag = _render_static_page(template_name)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content)
+    response['ETag'] = etag
+    return response
+
+
+def warm_templates():
+    # 起動時にすべてのテンプレートを読み込んで解析し、固定ページを描画しておく（最初のリクエストを遅くしない）
+    if not settings.TEMPLATE_CACHE:
+        return
+    template_dir = settings.TEMPLATES[0]['DIRS'][0]
+    for root, _, files in os.walk(template_dir):
+        for filename in files:
+            if not filename.endswith('.html'):
+                continue
+            template_name = os.path.relpath(os.path.join(root, filename), template_dir).replace(os.sep, '/')
+            try:
+                get_template(template_name)
+            except Exception:
+                logger.exception(f'Failed to load template: {template_name}')
+    for template_name in STATIC_PAGES:
+        try:
+            _render_static_page(template_name)
+        except Exception:
+            logger.exception(f'Failed to render static page: {template_name}')
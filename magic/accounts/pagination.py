@@ -0,0 +1,43 @@
+import base64
+import datetime
+import json
+
+from django.db.models import Q
+
+from .models import Meal
+
+# 食事履歴のキーセット（シーク）ページング
+# Meal.Meta.ordering と同じ (date, eaten_at, id) の降順で、前ページ最後の行より後ろを読む。
+# OFFSET を使わないので、どれだけ古いページでも複合インデックスの範囲検索1回で済む。
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(meal):
+    payload = [meal.date.isoformat(), meal.eaten_at.isoformat(), meal.pk]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        day, eaten_at, pk = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.date.fromisoformat(day), datetime.time.fromisoformat(eaten_at), int(pk)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+
+
+def meal_history_page(user, cursor=None, limit=20):
+    # (食事のリスト, 次ページのカーソル) を返す。最後のページでは次ページのカーソルは None
+    meals = Meal.objects.filter(user=user).order_by('-date', '-eaten_at', '-id')
+    if cursor:
+        day, eaten_at, pk = decode_cursor(cursor)
+        meals = meals.filter(
+            Q(date__lte=day),
+            Q(date__lt=day) | Q(date=day, eaten_at__lt=eaten_at) | Q(date=day, eaten_at=eaten_at, id__lt=pk),
+        )
+    page = list(meals[:limit + 1])
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return page[:limit], next_cursor
@@ -0,0 +1,76 @@
+import random
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# 読み込み専用レプリカへの振り分け
+# @read_from_replica を付けたビューの GET の間だけ、読み込みを DATABASE_REPLICAS のどれかに向ける。
+# 書き込みは常にプライマリ (default)。レプリカはリクエストの最初に1つだけ選んで ContextVar で持つので、
+# 1つのリクエストの中で遅れの違うレプリカを読み分けることはなく（カレンダーとダッシュボードで内容が前後しない）、
+# スレッドでも非同期ビューでも他のリクエストに影響しない。
+# 書き込みのリクエストを送ったユーザーは REPLICA_STICKY_SECONDS 秒間プライマリから読み、
+# レプリカの遅れで古い合計を表示（してキャッシュ）しないようにする (pin_to_primary)。
+_replica = ContextVar('accounts_replica', default=None)
+
+REPLICA_PIN_KEY = '_replica_pinned_until'
+
+
+def pin_to_primary(request):
+    # 期限はセッションに記録するので、次のリクエストを別のワーカーが処理しても効く
+    if settings.DATABASE_REPLICAS:
+        request.session[REPLICA_PIN_KEY] = int(time.time()) + settings.REPLICA_STICKY_SECONDS
+
+
+def _choose_replica(request):
+    # このリクエストで読むレプリカ（プライマリから読む場合は None）
+    if not settings.DATABASE_REPLICAS or request.method not in ('GET', 'HEAD'):
+        return None
+    # セッションとユーザーはここでプライマリから読んでおく（登録・ログイン直後にレプリカの遅れでログアウト扱いにしない）
+    if not request.user.is_authenticated:
+        return None
+    if request.session.get(REPLICA_PIN_KEY, 0) > time.time():
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+def read_from_replica(view):
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            token = _replica.set(await sync_to_async(_choose_replica)(request))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _replica.reset(token)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _replica.set(_choose_replica(request))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        # レプリカから読んだインスタンスを保存するときもプライマリに書く
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # レプリカはプライマリと同じデータなので、どちらから読んだもの同士でも関連づけてよい
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -1,7 +1,9 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .caches import bump_dashboard_version, bump_food_index_version, invalidate_calendar, invalidate_calendar_year
+from .models import UserProfile, Meal, DailyCalorieTotal, FoodFrequency, FoodItem
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,3 +16,66 @@ def create_user_profile(sender, instance, created, **kwargs):
             logger.debug(f'UserProfile created for user: {instance.username}')
         else:
             logger.debug(f'UserProfile already exists for user: {instance.username}')
+
+
+# 目標カロリーが変わったら、そのユーザーのカレンダーキャッシュを無効化する
+@receiver(post_save, sender=UserProfile)
+def invalidate_calendar_on_profile_change(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    if getattr(instance, '_loaded_target_calories', None) != instance.target_calories:
+        def invalidate():
+            invalidate_calendar(instance.user_id)
+            bump_dashboard_version(instance.user_id)
+        transaction.on_commit(invalidate)
+    instance._loaded_target_calories = instance.target_calories
+
+
+# 日別集計を更新し、コミット後に該当する年のカレンダーキャッシュとダッシュボードを無効化する
+# bulk_create などシグナルが送られない一括処理からも直接呼び出す
+def meals_changed(user_id, dates):
+    DailyCalorieTotal.objects.refresh(user_id, dates)
+    date_field = Meal._meta.get_field('date')
+    years = {date_field.to_python(day).year for day in dates if day}
+
+    def invalidate():
+        for year in years:
+            invalidate_calendar_year(user_id, year)
+        bump_dashboard_version(user_id)
+    transaction.on_commit(invalidate)
+
+
+# 食事の追加・更新時に日別集計を更新する（日付が移動した場合は移動元の日も更新）
+@receiver(post_save, sender=Meal)
+def update_daily_total_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old_user_id = getattr(instance, '_loaded_user_id', None)
+    old_date = getattr(instance, '_loaded_date', None)
+    if old_user_id is not None and old_user_id != instance.user_id:
+        meals_changed(old_user_id, [old_date])
+        old_date = None
+    meals_changed(instance.user_id, [instance.date, old_date])
+    instance._loaded_user_id = instance.user_id
+    instance._loaded_date = instance.date
+
+
+# 食事の追加時に、よく食べる食品の集計を更新する（編集・削除は減衰に任せて反映しない。
+# 候補から外すには views.forget_frequent_food か管理画面で行を削除する）
+@receiver(post_save, sender=Meal)
+def record_food_frequency(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        FoodFrequency.objects.record(instance.user_id, [instance])
+
+
+# 食事の削除時に日別集計を更新する
+@receiver(post_delete, sender=Meal)
+def update_daily_total_on_delete(sender, instance, **kwargs):
+    meals_changed(instance.user_id, [instance.date])
+
+
+# 食品カタログが変わったら、各プロセスの検索索引を作り直させる
+@receiver(post_save, sender=FoodItem)
+@receiver(post_delete, sender=FoodItem)
+def invalidate_food_index(sender, **kwargs):
+    transaction.on_commit(bump_food_index_version)
@@ -0,0 +1,80 @@
+import gzip
+import re
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # brotli がなければ gzip だけ作る
+    brotli = None
+
+# collectstatic で使う静的ファイルのストレージ
+# - CSS は空白とコメントを取り除いてから保存する（ハッシュは縮小後の内容で計算される）
+# - ファイル名に内容のハッシュを付けた版を作り、staticfiles.json に対応表を書き出す (ManifestStaticFilesStorage)
+# - ハッシュ付きの版の横に圧縮済みの .gz（brotli があれば .br も）を作り、配信時に圧縮し直さずに済むようにする
+# 配信は accounts.middleware.StaticAssetMiddleware で行う
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.map', '.html')
+MIN_COMPRESS_SIZE = 256  # これより小さいファイルは圧縮しない (バイト)
+MIN_COMPRESS_RATIO = 0.95  # 元の大きさの 95% 未満にならない場合は圧縮版を作らない
+
+# 文字列（content: "a; b" や url("a b.png") など）とコメント。/*! で始まるライセンス表記は残す
+_CSS_STRING_OR_COMMENT = re.compile(r'''"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|/\*.*?\*/''', re.S)
+_CSS_PLACEHOLDER = re.compile(r'\x00(\d+)\x00')
+_CSS_SPACE = re.compile(r'\s+')
+_CSS_PUNCTUATION_SPACE = re.compile(r'\s*([{};,])\s*')
+
+
+def minify_css(css):
+    # 文字列と残すコメントは置き換えておき、空白を詰めた後で元に戻す（中の空白や記号を変えない）
+    kept = []
+
+    def protect(match):
+        token = match.group()
+        if token.startswith('/*') and not token.startswith('/*!'):
+            return ''
+        kept.append(token)
+        return f'\x00{len(kept) - 1}\x00'
+
+    css = _CSS_STRING_OR_COMMENT.sub(protect, css)
+    css = _CSS_SPACE.sub(' ', css)
+    css = _CSS_PUNCTUATION_SPACE.sub(r'\1', css)
+    css = css.replace(';}', '}').strip()
+    return _CSS_PLACEHOLDER.sub(lambda match: kept[int(match.group(1))], css)
+
+
+def compress(content):
+    # (拡張子, 圧縮済みの内容) を返す。小さくならないものは返さない
+    candidates = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        candidates.append(('.br', brotli.compress(content)))
+    return [
+        (extension, compressed) for extension, compressed in candidates
+        if len(compressed) < len(content) * MIN_COMPRESS_RATIO
+    ]
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def _save(self, name, content):
+        if name.endswith('.css'):
+            # ハッシュの計算で読み終えたファイルが渡されることがあるので、先頭から読む
+            content.seek(0)
+            content = ContentFile(minify_css(content.read().decode('utf-8')).encode('utf-8'))
+        return super()._save(name, content)
+
+    def post_process(self, *args, **kwargs):
+        yield from super().post_process(*args, **kwargs)
+        if kwargs.get('dry_run'):
+            return
+        for name in set(self.hashed_files.values()):
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            with self.open(name) as f:
+                content = f.read()
+            if len(content) < MIN_COMPRESS_SIZE:
+                continue
+            for extension, compressed in compress(content):
+                if self.exists(name + extension):
+                    self.delete(name + extension)
+                self._save(name + extension, ContentFile(compressed))
+                yield name, name + extension, True
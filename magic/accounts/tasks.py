@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db import transaction
+
+from . import deletion
+from .caches import bump_dashboard_version, invalidate_calendar
+from .jobs import MORE, task
+from .models import DailyCalorieTotal
+
+# run_worker コマンドで実行するバックグラウンド処理（accounts.jobs.enqueue で登録する）
+
+
+# 日別集計の作り直し。rebuild_daily_totals コマンドの --background なしでもここを呼ぶ
+def rebuild_user_daily_totals(user_id):
+    with transaction.atomic():
+        DailyCalorieTotal.objects.rebuild(user_id)
+    invalidate_calendar(user_id)
+    bump_dashboard_version(user_id)
+    return DailyCalorieTotal.objects.filter(user_id=user_id).count()
+
+
+# 日別集計の作り直し（payload: user_id）
+@task('rebuild_daily_totals')
+def rebuild_daily_totals(job):
+    return {'days': rebuild_user_daily_totals(job.payload['user_id'])}
+
+
+# アカウントの削除（payload: user_id）
+# 食事などを JOB_BATCH_SIZE 件ずつ別々のトランザクションで削除し、最後にユーザーを削除する (accounts.deletion)
+@task('delete_user')
+def delete_user(job):
+    if not deletion.delete_account_step(job.payload['user_id'], job.progress, settings.JOB_BATCH_SIZE):
+        return MORE
+    # この処理自身の user も SET_NULL で外れたので、保存し直すときに戻さないようにする
+    job.user = None
+    return dict(job.progress)
@@ -0,0 +1,17 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+# テストはすべて default のテスト用データベースで行う
+# レプリカ (DATABASE_REPLICAS) は TEST の MIRROR で default を指すが、別の接続なので
+# テストのトランザクションの中のデータが見えず、テストごとのデータベースの制限にも掛かる。
+# 振り分けを確かめるテストは override_settings で DATABASE_REPLICAS を指定する
+class PrimaryOnlyTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.primary_only = override_settings(DATABASE_REPLICAS=[])
+        self.primary_only.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.primary_only.disable()
+        super().teardown_test_environment(**kwargs)
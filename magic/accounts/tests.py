@@ -0,0 +1,893 @@
+import datetime
+import gzip
+import re
+import threading
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, router
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import deletion, food_search
+from .caches import dashboard_version, get_calendar_year, invalidate_calendar_year
+from .db.pool import ConnectionPool
+from .instrumentation import capture_templates
+from .metrics import registry as metrics_registry
+from .middleware import ReplicaPinMiddleware
+from .models import DailyCalorieTotal, Food, FoodFrequency, FoodItem, Job, Meal, RelatedData, UserProfile
+from .routers import REPLICA_PIN_KEY, read_from_replica
+from .storage import minify_css
+
+
+# 実行計画の回帰テスト
+# 各ビューが発行する accounts テーブルへの SELECT を EXPLAIN し、
+# フルスキャンやファイルソートに落ちていないことを確認する。
+# SQLite と MySQL/MariaDB に対応（MariaDB で確認する場合は DATABASES をローカルのコンテナに向けて実行する）
+class QueryPlanTests(TestCase):
+    USERS = 3
+    DAYS = 120
+    MEAL_TYPES = ['breakfast', 'lunch', 'dinner']
+
+    @classmethod
+    def setUpTestData(cls):
+        start = datetime.date(2024, 1, 1)
+        meals = []
+        for number in range(cls.USERS):
+            user = User.objects.create_user(f'plan{number}', password='password')
+            for offset in range(cls.DAYS):
+                for hour, meal_type in zip((8, 12, 19), cls.MEAL_TYPES):
+                    meals.append(Meal(
+                        user=user,
+                        food_name=f'食事{offset}',
+                        calories=400 + hour * 10,
+                        date=start + datetime.timedelta(days=offset),
+                        eaten_at=datetime.time(hour, 0),
+                        meal_type=meal_type,
+                    ))
+        Meal.objects.bulk_create(meals, batch_size=500)
+        for user_id in User.objects.values_list('pk', flat=True):
+            DailyCalorieTotal.objects.rebuild(user_id)
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+            elif connection.vendor == 'mysql':
+                cursor.execute('ANALYZE TABLE accounts_meal, accounts_dailycalorietotal')
+                cursor.fetchall()
+
+        cls.user = User.objects.get(username='plan0')
+        cls.meal = Meal.objects.filter(user=cls.user).first()
+
+    def setUp(self):
+        if connection.vendor not in ('sqlite', 'mysql'):
+            self.skipTest(f'{connection.vendor} の実行計画には未対応です')
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                return [row[-1] for row in cursor.fetchall()]
+            cursor.execute(f'EXPLAIN {sql}')
+            columns = [column[0].lower() for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def plan_problems(self, sql):
+        problems = []
+        for step in self.explain(sql):
+            if connection.vendor == 'sqlite':
+                if 'TEMP B-TREE' in step:
+                    problems.append(step)
+                elif step.startswith('SCAN') and 'accounts_' in step:
+                    problems.append(step)
+            else:
+                if not (step.get('table') or '').startswith('accounts_'):
+                    continue
+                if step.get('type') in ('ALL', 'index') or 'filesort' in (step.get('extra') or ''):
+                    problems.append(f"{step['table']}: type={step['type']} extra={step['extra']}")
+        return problems
+
+    def assertIndexedQueries(self, method, url, data=None, evaluate=()):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, data or {})
+            # テンプレートで使われない遅延クエリセットもここで評価して対象に含める
+            for name in evaluate:
+                list(response.context[name])
+        self.assertLess(response.status_code, 400)
+
+        checked = 0
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or 'accounts_' not in sql:
+                continue
+            checked += 1
+            problems = self.plan_problems(sql)
+            self.assertFalse(problems, f'{url} のクエリがインデックスを使っていません:\n{sql}\n{problems}')
+        self.assertGreater(checked, 0, f'{url} で accounts テーブルへのクエリがありません')
+
+    def test_home(self):
+        self.assertIndexedQueries('get', reverse('home'), evaluate=['latest_meals'])
+
+    def test_enter_meal_data(self):
+        self.assertIndexedQueries('get', reverse('enter_meal_data'), {'selected_date': '2024-02-01'})
+
+    def test_add_meal_get(self):
+        self.assertIndexedQueries('get', reverse('add_meal'))
+
+    def test_add_meal_post(self):
+        self.assertIndexedQueries('post', reverse('add_meal'), {
+            'meal_type': 'lunch',
+            'food_name': 'カレー',
+            'date': '2024-02-01',
+            'calories': '800',
+            'eaten_at': '12:30',
+        })
+
+    def test_calories_by_year(self):
+        self.assertIndexedQueries('get', reverse('calories_by_year', args=[2024]))
+
+    def test_edit_meal(self):
+        self.assertIndexedQueries('get', reverse('edit_meal', args=[self.meal.id]))
+
+    def test_confirm_delete_meal(self):
+        self.assertIndexedQueries('get', reverse('confirm_delete_meal', args=[self.meal.id]))
+
+    def test_delete_meal(self):
+        self.assertIndexedQueries('post', reverse('delete_meal', args=[self.meal.id]))
+
+    def test_trends_api(self):
+        self.assertIndexedQueries('get', reverse('trends_api'), {'period': '10y'})
+
+    def test_meal_revisions(self):
+        self.assertIndexedQueries('get', reverse('meal_revisions', args=[self.meal.id]))
+
+    def test_meal_history_api(self):
+        response = self.client.get(reverse('meal_history_api'), {'limit': 50})
+        cursor = response.json()['next_cursor']
+        self.assertIndexedQueries('get', reverse('meal_history_api'), {'cursor': cursor, 'limit': 50})
+
+
+# 日別集計 (DailyCalorieTotal) の更新
+class DailyCalorieTotalTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('daily', password='password')
+        self.other = User.objects.create_user('daily2', password='password')
+        self.day = datetime.date(2024, 3, 1)
+        self.next_day = datetime.date(2024, 3, 2)
+        self.bread = self.add_meal(self.user, self.day, 200, 'breakfast')
+        self.curry = self.add_meal(self.user, self.day, 800, 'dinner')
+
+    def add_meal(self, user, day, calories, meal_type):
+        return Meal.objects.create(
+            user=user, food_name='食事', calories=calories, date=day,
+            eaten_at=datetime.time(12, 0), meal_type=meal_type,
+        )
+
+    def totals(self, user):
+        return dict(DailyCalorieTotal.objects.filter(user=user).values_list('date', 'total'))
+
+    def test_add(self):
+        row = DailyCalorieTotal.objects.get(user=self.user, date=self.day)
+        self.assertEqual((row.total, row.meal_count), (1000, 2))
+        self.assertEqual(row.by_meal_type, {'breakfast': 200, 'dinner': 800})
+
+    def test_edit_moves_meal_to_another_date(self):
+        self.curry.date = self.next_day
+        self.curry.save()
+        self.assertEqual(self.totals(self.user), {self.day: 200, self.next_day: 800})
+
+        # 移動元の日に食事が残らなければ集計行も消える
+        self.bread.date = self.next_day
+        self.bread.save()
+        self.assertEqual(self.totals(self.user), {self.next_day: 1000})
+
+    def test_edit_moves_meal_to_another_user(self):
+        self.curry.user = self.other
+        self.curry.save()
+        self.assertEqual(self.totals(self.user), {self.day: 200})
+        self.assertEqual(self.totals(self.other), {self.day: 800})
+
+    def test_delete_lowers_total(self):
+        self.curry.delete()
+        self.assertEqual(self.totals(self.user), {self.day: 200})
+        self.bread.delete()
+        self.assertEqual(self.totals(self.user), {})
+
+    def test_refresh_upserts_row_created_concurrently(self):
+        # 集計行を書き込む直前に、別のリクエストが同じ日の集計行を作った場合も一意制約の違反にならない
+        DailyCalorieTotal.objects.filter(user=self.user).delete()
+        inserted = []
+
+        def insert_first(execute, sql, params, many, context):
+            if not inserted and sql.startswith('INSERT INTO "accounts_dailycalorietotal"'):
+                inserted.append(True)
+                DailyCalorieTotal.objects.create(user=self.user, date=self.day, total=1, meal_count=1)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(insert_first):
+            DailyCalorieTotal.objects.refresh(self.user.pk, [self.day])
+        self.assertTrue(inserted)
+        self.assertEqual(self.totals(self.user), {self.day: 1000})
+
+    def test_rebuild_command_invalidates_caches(self):
+        # --background なしでもバックグラウンド処理と同じくキャッシュを無効化する
+        cache.clear()
+        DailyCalorieTotal.objects.filter(user=self.user).update(total=1)
+        self.assertEqual(get_calendar_year(self.user.pk, 2024, lambda: 'old')['data'], 'old')
+        version = dashboard_version(self.user.pk)
+
+        call_command('rebuild_daily_totals', 'daily', stdout=StringIO())
+        self.assertEqual(self.totals(self.user), {self.day: 1000})
+        self.assertEqual(get_calendar_year(self.user.pk, 2024, lambda: 'new')['data'], 'new')
+        self.assertNotEqual(dashboard_version(self.user.pk), version)
+
+
+# プロフィールの目標カロリー
+class UserProfileTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('profile', password='password')
+        UserProfile.objects.filter(user=self.user).update(age=25, gender='M', target_calories=2400)
+
+    def stored_target(self):
+        return UserProfile.objects.values_list('target_calories', flat=True).get(user=self.user)
+
+    def test_target_recomputed_on_change(self):
+        profile = UserProfile.objects.get(user=self.user)
+        profile.age = 40
+        profile.save(update_fields=['age'])
+        self.assertEqual(self.stored_target(), 2200)
+
+        profile.gender = 'F'
+        profile.save(update_fields=['gender'])
+        self.assertEqual(self.stored_target(), 1800)
+
+        profile.target_calories_override = 1500
+        profile.save(update_fields=['target_calories_override'])
+        self.assertEqual(self.stored_target(), 1500)
+
+        profile.target_calories_override = None
+        profile.save()
+        self.assertEqual(self.stored_target(), 1800)
+
+    def test_target_change_invalidates_calendar(self):
+        get_calendar_year(self.user.pk, 2024, lambda: 'old')
+        version = dashboard_version(self.user.pk)
+        profile = UserProfile.objects.get(user=self.user)
+
+        # 目標カロリーが変わらない保存では無効化しない
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.age = 26
+            profile.save()
+        self.assertEqual(get_calendar_year(self.user.pk, 2024, lambda: 'new')['data'], 'old')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.age = 40
+            profile.save()
+        self.assertEqual(get_calendar_year(self.user.pk, 2024, lambda: 'new')['data'], 'new')
+        self.assertNotEqual(dashboard_version(self.user.pk), version)
+
+
+# ホーム画面のダッシュボードのキャッシュ
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+class HomeDashboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('dashboard', password='password')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def add_meal(self, calories):
+        with self.captureOnCommitCallbacks(execute=True):
+            Meal.objects.create(
+                user=self.user,
+                food_name='カレー',
+                calories=calories,
+                date=datetime.date.today(),
+                eaten_at=datetime.time(12, 0),
+                meal_type='lunch',
+            )
+
+    def test_cached_dashboard_query_count(self):
+        self.add_meal(800)
+        self.client.get(reverse('home'))
+        # キャッシュ済みのダッシュボードではログインユーザー（プロフィール込み）の読み込みだけになる
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, '800 / ')
+
+    def test_meal_write_refreshes_dashboard(self):
+        self.add_meal(800)
+        self.client.get(reverse('home'))
+        self.add_meal(500)
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, '1300 / ')
+
+    def test_model_backend_session_stays_logged_in(self):
+        # ProfileModelBackend に切り替える前にログインしたセッション
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        self.assertEqual(self.client.get(reverse('home')).status_code, 200)
+
+
+# カレンダーAPIの入力チェック
+class CalendarApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('calendar', password='password')
+        self.client.force_login(self.user)
+
+    def test_year_out_of_range(self):
+        for url in [
+            reverse('calories_by_year', args=[0]),
+            reverse('calories_by_year', args=[10000]),
+            reverse('calories_by_month', args=[0, 1]),
+            reverse('calories_by_month', args=[10000, 1]),
+        ]:
+            self.assertEqual(self.client.get(url).status_code, 400, url)
+        self.assertEqual(self.client.get(reverse('calories_by_month', args=[9999, 12])).status_code, 200)
+
+    def add_meal(self, day, calories):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Meal.objects.create(
+                user=self.user, food_name='カレー', calories=calories, date=day,
+                eaten_at=datetime.time(12, 0), meal_type='lunch',
+            )
+
+    def test_meal_write_changes_year_and_etag(self):
+        url = reverse('calories_by_year', args=[2024])
+        self.add_meal(datetime.date(2024, 5, 1), 500)
+        response = self.client.get(url)
+        self.assertEqual(response.json()['2024-05-01']['calories'], 500)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+        self.add_meal(datetime.date(2024, 5, 1), 300)
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['2024-05-01']['calories'], 800)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_year_keeps_zero_calorie_days(self):
+        # 0 kcal の食事だけの日も、集計行があれば返す
+        self.add_meal(datetime.date(2024, 5, 1), 0)
+        self.add_meal(datetime.date(2024, 5, 2), 300)
+        data = self.client.get(reverse('calories_by_year', args=[2024])).json()
+        self.assertEqual({day: value['calories'] for day, value in data.items()}, {'2024-05-01': 0, '2024-05-02': 300})
+
+    def test_range_columnar_across_years(self):
+        self.add_meal(datetime.date(2023, 12, 30), 500)
+        self.add_meal(datetime.date(2024, 1, 2), 0)
+        self.add_meal(datetime.date(2024, 1, 3), 700)
+        response = self.client.get(reverse('calories_by_range'), {'from': '2023-12-29', 'to': '2024-01-02'})
+        self.assertEqual(response.json(), {
+            'start': '2023-12-29',
+            'totals': [0, 500, 0, 0, 0],
+            'requiredCalories': self.user.profile.target_calories,
+        })
+
+    def test_month_columnar(self):
+        self.add_meal(datetime.date(2024, 1, 31), 400)
+        self.add_meal(datetime.date(2024, 2, 1), 100)
+        self.add_meal(datetime.date(2024, 2, 29), 200)
+        self.add_meal(datetime.date(2024, 3, 1), 300)
+        data = self.client.get(reverse('calories_by_month', args=[2024, 2])).json()
+        self.assertEqual(data['start'], '2024-02-01')
+        self.assertEqual(data['totals'], [100] + [0] * 27 + [200])
+        self.assertEqual(data['requiredCalories'], self.user.profile.target_calories)
+        # 食事のない月も日数分の 0 を返す
+        self.assertEqual(self.client.get(reverse('calories_by_month', args=[2023, 2])).json()['totals'], [0] * 28)
+
+    def test_entry_built_before_invalidation_is_not_served(self):
+        # コミット前のデータで作った結果が、無効化の後に書き込まれる場合
+        def build_stale():
+            invalidate_calendar_year(self.user.pk, 2024)
+            return {'stale': True}
+
+        get_calendar_year(self.user.pk, 2024, build_stale)
+        entry = get_calendar_year(self.user.pk, 2024, lambda: {'stale': False})
+        self.assertEqual(entry['data'], {'stale': False})
+
+
+# リクエストの計測 (QueryMetricsMiddleware) と Prometheus 形式の出力
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='password', is_staff=True)
+        cls.user = User.objects.create_user('member', password='password')
+
+    def setUp(self):
+        metrics_registry.reset()
+        self.addCleanup(metrics_registry.reset)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_server_timing_without_sampling(self):
+        response = self.client.get(reverse('logout_complete'))
+        self.assertRegex(response['Server-Timing'], r'^app;dur=\d+\.\d$')
+        self.assertEqual(metrics_registry.render().count('_count{'), 0)
+
+    @override_settings(METRICS_SAMPLE_RATE=1)
+    def test_server_timing_with_sampling(self):
+        response = self.client.get(reverse('logout_complete'))
+        self.assertRegex(response['Server-Timing'], r'^app;dur=\d+\.\d, db;dur=\d+\.\d;desc="\d+ queries"$')
+
+    @override_settings(METRICS_SAMPLE_RATE=1)
+    def test_prometheus_format(self):
+        for _ in range(2):
+            self.client.get(reverse('logout_complete'))
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if line.startswith('#'):
+                self.assertRegex(line, r'^# (HELP [a-z_]+ .+|TYPE [a-z_]+ (histogram|counter))$')
+                continue
+            match = re.fullmatch(r'([a-z_]+)\{([^}]*)\} (\S+)', line)
+            self.assertIsNotNone(match, line)
+            samples[match.group(1), match.group(2)] = float(match.group(3))
+
+        view = 'view="logout_complete"'
+        self.assertEqual(samples['accounts_view_duration_seconds_count', view], 2)
+        self.assertEqual(samples['accounts_view_duration_seconds_bucket', f'{view},le="+Inf"'], 2)
+        self.assertEqual(samples['accounts_view_sql_queries_count', view], 2)
+        self.assertEqual(samples['accounts_view_duplicate_queries_total', view], 0)
+        # バケットは累積なので le が大きいほど減らない
+        buckets = [
+            value for (name, labels), value in samples.items()
+            if name == 'accounts_view_duration_seconds_bucket' and labels.startswith(view)
+        ]
+        self.assertEqual(buckets, sorted(buckets))
+
+    def test_staff_only(self):
+        url = reverse('metrics')
+        response = self.client.get(url)
+        self.assertRedirects(response, f"{reverse('admin:login')}?next={url}", fetch_redirect_response=False)
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertRedirects(response, f"{reverse('admin:login')}?next={url}", fetch_redirect_response=False)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+# 固定ページは1回だけ描画して使い回し、ETag で 304 を返す
+class StaticPageTests(TestCase):
+    def test_static_page_conditional_get(self):
+        response = self.client.get(reverse('logout_complete'))
+        self.assertContains(response, reverse('login'))
+        etag = response['ETag']
+        with capture_templates() as templates:
+            response = self.client.get(reverse('logout_complete'), headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(templates.renders, 0)
+
+
+# collectstatic で作ったハッシュ付きの静的ファイルを、圧縮版と immutable なキャッシュ指定で配信する
+class StaticAssetTests(TestCase):
+    def test_hashed_asset(self):
+        url = staticfiles_storage.url('css/style8.css')
+        self.assertNotEqual(url, settings.STATIC_URL + 'css/style8.css')
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn(b'body{', gzip.decompress(response.content))
+
+        response = self.client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_unhashed_asset_is_revalidated(self):
+        response = self.client.get(settings.STATIC_URL + 'css/style8.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['Cache-Control'], 'public, no-cache')
+
+    def test_minify_css_keeps_strings(self):
+        css = '''/* 消す; コメント */
+            a::before { content: "a; b" ; }
+            b { background: url("a b.png") ; font-family: "Hiragino  Sans" , sans-serif ; }'''
+        self.assertEqual(
+            minify_css(css),
+            'a::before{content: "a; b"}b{background: url("a b.png");font-family: "Hiragino  Sans",sans-serif}',
+        )
+
+    def test_security_headers_and_rejected_encoding(self):
+        url = staticfiles_storage.url('css/style8.css')
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip;q=0, identity'})
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+        response = self.client.get(url, headers={'Accept-Encoding': 'br;q=0, *'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+
+# 接続プール (accounts.db.mysql_pooled) の使い回しと作り直し
+class ConnectionPoolTests(SimpleTestCase):
+    class FakeConnection:
+        def __init__(self):
+            self.closed = False
+            self.alive = True
+
+        def close(self):
+            self.closed = True
+
+    def ping(self, connection):
+        if not connection.alive:
+            raise OSError('gone away')
+
+    def test_reuse_and_recycle(self):
+        pool = ConnectionPool(max_size=1, max_lifetime=3600, ping_after=0)
+        first, reused = pool.acquire(self.FakeConnection, self.ping)
+        self.assertFalse(reused)
+        pool.release(first)
+        second, reused = pool.acquire(self.FakeConnection, self.ping)
+        self.assertIs(second, first)
+        self.assertTrue(reused)
+
+        # 応答しない接続は閉じて作り直す
+        pool.release(second)
+        first.alive = False
+        third, reused = pool.acquire(self.FakeConnection, self.ping)
+        self.assertFalse(reused)
+        self.assertTrue(first.closed)
+
+        # 待機数の上限を超えた接続は閉じる
+        extra, _ = pool.acquire(self.FakeConnection, self.ping)
+        pool.release(third)
+        pool.release(extra)
+        self.assertTrue(extra.closed)
+        self.assertEqual((pool.created, pool.reused, len(pool.idle)), (3, 1, 1))
+
+
+# 食事データの一括インポート
+class ImportMealsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('importer', password='password')
+        self.client.force_login(self.user)
+
+    def upload(self, content, name='meals.csv'):
+        return self.client.post(reverse('import_meals'), {'file': SimpleUploadedFile(name, content)})
+
+    def csv_rows(self, count):
+        return ''.join(f'lunch,パン{n},2024-01-01,200,12:00\n' for n in range(count)).encode()
+
+    def test_import_csv(self):
+        response = self.upload('meal_type,food_name,date,calories,eaten_at\n'.encode() + self.csv_rows(3))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 3)
+        self.assertEqual(DailyCalorieTotal.objects.get(user=self.user).total, 600)
+
+    def test_non_utf8_row_saves_nothing(self):
+        # 前半は UTF-8、最後の行だけ Shift_JIS（Excel で追記した CSV など）
+        content = 'meal_type,food_name,date,calories,eaten_at\n'.encode() + self.csv_rows(1500)
+        content += 'lunch,おにぎり,2024-01-02,180,12:00\n'.encode('shift_jis')
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['line'], 1502)
+        self.assertEqual(response.json()['created'], 0)
+        self.assertFalse(Meal.objects.exists())
+
+
+# 食品検索の索引は起動時に作り、カタログが変わったら検索を待たせずに別のスレッドで作り直す
+class FoodIndexTests(TransactionTestCase):
+    def test_rebuild_off_request_path(self):
+        FoodItem.objects.create(name='りんご', calories_per_100g=54)
+        food_search.warm_index()
+        self.assertEqual([item['name'] for item in food_search.search_foods('りん')], ['りんご'])
+
+        FoodItem.objects.create(name='りんごジュース', calories_per_100g=44)
+        # 作り直しの間は前の索引で答える
+        self.assertEqual([item['name'] for item in food_search.search_foods('りん')], ['りんご'])
+        for thread in threading.enumerate():
+            if thread.name == 'food-index-rebuild':
+                thread.join()
+        self.assertEqual(len(food_search.search_foods('りん')), 2)
+
+
+# まとめて入力
+class BatchAddMealsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('batch', password='password')
+        self.client.force_login(self.user)
+
+    def test_redirects_after_post_and_ignores_blank_rows_from_yesterday(self):
+        # 前日に開いた画面（空の行の日付が前日のまま）から送信する
+        yesterday = (datetime.date.today() - datetime.timedelta(days=1)).isoformat()
+        data = {'form-TOTAL_FORMS': 3, 'form-INITIAL_FORMS': 0}
+        for index in range(3):
+            data[f'form-{index}-date'] = yesterday
+        data.update({'form-0-meal_type': 'breakfast', 'form-0-food_name': 'パン', 'form-0-calories': 200, 'form-0-eaten_at': '08:00'})
+
+        response = self.client.post(reverse('batch_add_meals'), data)
+        self.assertRedirects(response, reverse('batch_add_meals'), fetch_redirect_response=False)
+        self.assertEqual(Meal.objects.filter(user=self.user).count(), 1)
+        self.assertContains(self.client.get(reverse('batch_add_meals')), '200 kcal')
+        # 結果は1回だけ表示する
+        self.assertIsNone(self.client.get(reverse('batch_add_meals')).context['statuses'])
+
+
+# 食事履歴APIのキーセットページング
+class MealHistoryApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('history', password='password')
+        # 同じ日付・同じ時刻の食事が多く、ページの境目で (date, eaten_at) が同じになる
+        meals = []
+        for day in [datetime.date(2024, 1, 1), datetime.date(2024, 1, 2)]:
+            for eaten_at in [datetime.time(8, 0), datetime.time(12, 0)]:
+                for _ in range(4):
+                    meals.append(Meal(
+                        user=cls.user, food_name='パン', calories=200, date=day, eaten_at=eaten_at, meal_type='breakfast',
+                    ))
+        Meal.objects.bulk_create(meals)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_walks_every_page_in_meta_ordering(self):
+        self.assertEqual(Meal._meta.ordering, ['-date', '-eaten_at', '-id'])
+        expected = list(Meal.objects.filter(user=self.user).values_list('id', flat=True))
+        for limit in [1, 3, 4, 5]:
+            ids = []
+            cursor = None
+            while True:
+                params = {'limit': limit}
+                if cursor:
+                    params['cursor'] = cursor
+                data = self.client.get(reverse('meal_history_api'), params).json()
+                self.assertLessEqual(len(data['meals']), limit)
+                ids.extend(meal['id'] for meal in data['meals'])
+                cursor = data['next_cursor']
+                if cursor is None:
+                    break
+            self.assertEqual(ids, expected, limit)
+
+    def test_malformed_cursor(self):
+        for cursor in ['???', 'bm90IGpzb24', 'WzEsMl0', 'WyJ4IiwiMTI6MDAiLDFd']:
+            response = self.client.get(reverse('meal_history_api'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+
+
+# よく食べる食品とワンクリック追加
+class FrequentFoodsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('frequent', password='password')
+        self.client.force_login(self.user)
+        self.today = datetime.date.today()
+
+    def add_meal(self, food_name, days_ago=0, calories=300, meal_type='lunch'):
+        return Meal.objects.create(
+            user=self.user, food_name=food_name, calories=calories, meal_type=meal_type,
+            date=self.today - datetime.timedelta(days=days_ago), eaten_at=datetime.time(12, 0),
+        )
+
+    def test_score_prefers_recent_and_frequent(self):
+        for _ in range(3):
+            self.add_meal('昔のカレー', days_ago=60)
+        self.add_meal('パン')
+        for _ in range(2):
+            self.add_meal('ラーメン')
+        names = [row.food_name for row in FoodFrequency.objects.top(self.user, 10)]
+        self.assertEqual(names, ['ラーメン', 'パン', '昔のカレー'])
+
+    def test_count_and_latest_values(self):
+        self.add_meal('カレー', days_ago=1, calories=800, meal_type='dinner')
+        # 前の日付の食事をあとから登録しても、カロリーと食事の種類は新しいほうのまま
+        self.add_meal('カレー', days_ago=5, calories=500, meal_type='lunch')
+        row = FoodFrequency.objects.get(user=self.user, food_name='カレー')
+        self.assertEqual((row.count, row.calories, row.meal_type), (2, 800, 'dinner'))
+        self.assertEqual(row.last_eaten, self.today - datetime.timedelta(days=1))
+
+        self.add_meal('カレー', calories=700, meal_type='breakfast')
+        row.refresh_from_db()
+        self.assertEqual((row.count, row.calories, row.meal_type, row.last_eaten), (3, 700, 'breakfast', self.today))
+
+    def test_record_upserts_row_created_concurrently(self):
+        # 行を作る直前に、別のリクエストが同じ食品を初めて記録した場合も一意制約の違反にならず、回数を足し合わせる
+        inserted = []
+
+        def insert_first(execute, sql, params, many, context):
+            if not inserted and sql.startswith('INSERT INTO "accounts_foodfrequency"'):
+                inserted.append(True)
+                FoodFrequency.objects.create(
+                    user=self.user, food_name='カレー', meal_type='lunch', calories=800,
+                    count=1, last_eaten=self.today, score=0,
+                )
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(insert_first):
+            self.add_meal('カレー')
+        self.assertTrue(inserted)
+        row = FoodFrequency.objects.get(user=self.user, food_name='カレー')
+        self.assertEqual(row.count, 2)
+        self.assertGreater(row.score, 0)
+
+    def test_quick_add_meal(self):
+        self.add_meal('パン', calories=200)
+        response = self.client.post(reverse('quick_add_meal'), {
+            'food_name': 'カレー', 'calories': 800, 'meal_type': 'dinner',
+        })
+        self.assertEqual(response.status_code, 201)
+        result = response.json()
+        self.assertEqual(result['food_name'], 'カレー')
+        self.assertEqual(result['date'], self.today.isoformat())
+        self.assertEqual(result['total_calories'], 1000)
+        self.assertEqual(result['over_target'], 1000 > result['target_calories'])
+        self.assertTrue(Meal.objects.filter(pk=result['id'], user=self.user).exists())
+
+    def test_quick_add_meal_invalid(self):
+        response = self.client.post(reverse('quick_add_meal'), {'calories': 'たくさん', 'meal_type': 'dinner'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']), {'food_name', 'calories'})
+        self.assertFalse(Meal.objects.filter(user=self.user).exists())
+
+    def test_frequent_foods_and_forget(self):
+        self.add_meal('パン', calories=200, meal_type='breakfast')
+        self.add_meal('パン', calories=200, meal_type='breakfast')
+        self.add_meal('カレエ')
+        response = self.client.get(reverse('frequent_foods'), {'limit': 1})
+        self.assertEqual(response.json()['results'], [{
+            'food_name': 'パン', 'meal_type': 'breakfast', 'calories': 200,
+            'count': 2, 'last_eaten': self.today.isoformat(),
+        }])
+
+        # 入力を誤った食品を候補から外す
+        response = self.client.post(reverse('forget_frequent_food'), {'food_name': 'カレエ'})
+        self.assertEqual(response.status_code, 200)
+        names = [food['food_name'] for food in self.client.get(reverse('frequent_foods')).json()['results']]
+        self.assertEqual(names, ['パン'])
+        response = self.client.post(reverse('forget_frequent_food'), {'food_name': 'カレエ'})
+        self.assertEqual(response.status_code, 404)
+
+
+# 食事の編集履歴
+class MealRevisionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('editor', password='password')
+        cls.meal = Meal.objects.create(
+            user=cls.user, food_name='カレー', calories=800, date=datetime.date(2024, 2, 1),
+            eaten_at=datetime.time(12, 0), meal_type='lunch',
+        )
+        RelatedData.objects.bulk_create([RelatedData(meal=cls.meal, additional_info='元の情報') for _ in range(3)])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def edit(self, **changes):
+        data = {
+            'meal_type': 'lunch', 'food_name': 'カレー', 'date': '2024-02-01', 'calories': '800', 'eaten_at': '12:00',
+        }
+        data.update(changes)
+        session = self.client.session
+        session['updated_meal_id'] = self.meal.id
+        session.save()
+        return self.client.post(reverse('edit-complete'), data)
+
+    def test_edit_records_changed_fields_only(self):
+        self.edit(calories='650', eaten_at='12:30')
+        self.edit(calories='650', eaten_at='12:30')  # 変更なしでは履歴を残さない
+        revisions = self.client.get(reverse('meal_revisions', args=[self.meal.id])).json()['revisions']
+        self.assertEqual(len(revisions), 1)
+        self.assertEqual(revisions[0]['changes'], {'calories': [800, 650], 'eaten_at': ['12:00:00', '12:30:00']})
+        self.assertEqual(set(RelatedData.objects.values_list('additional_info', flat=True)), {'更新された情報'})
+
+    def test_related_data_updated_in_one_query(self):
+        with CaptureQueriesContext(connection) as context:
+            self.edit(food_name='ハヤシライス')
+        related_queries = [query['sql'] for query in context.captured_queries if 'accounts_relateddata' in query['sql']]
+        self.assertEqual(len(related_queries), 1)
+        self.assertTrue(related_queries[0].startswith('UPDATE'))
+
+    def test_other_users_meal(self):
+        User.objects.create_user('other', password='password')
+        self.client.login(username='other', password='password')
+        self.assertEqual(self.client.get(reverse('meal_revisions', args=[self.meal.id])).status_code, 404)
+
+
+# アカウント削除をバックグラウンド処理で分割して実行する
+@override_settings(JOB_BATCH_SIZE=2)
+class AccountDeletionJobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('leaving', password='password')
+        Meal.objects.bulk_create([
+            Meal(
+                user=self.user, food_name='パン', calories=200, date=datetime.date(2024, 1, day),
+                eaten_at=datetime.time(8, 0), meal_type='breakfast',
+            )
+            for day in range(1, 6)
+        ])
+        for meal in Meal.objects.filter(user=self.user):
+            Food.objects.create(meal=meal, name='パン')
+            RelatedData.objects.create(meal=meal, additional_info='朝')
+        DailyCalorieTotal.objects.rebuild(self.user.pk)
+        self.client.force_login(self.user)
+
+    def test_delete_account_in_background(self):
+        response = self.client.get(reverse('delete_in_progress'))
+        status_url = response.context['status_url']
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(self.client.get(status_url).json()['status'], Job.QUEUED)
+
+        call_command('run_worker', once=True, stdout=StringIO())
+        status = self.client.get(status_url).json()
+        self.assertEqual(status['status'], Job.SUCCEEDED)
+        self.assertEqual(status['result'], {'meals_total': 5, 'meals_deleted': 5, 'rollups_deleted': 5})
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        for model in [Meal, Food, RelatedData, DailyCalorieTotal]:
+            self.assertFalse(model.objects.exists(), model.__name__)
+
+        # 別のセッションからは見えない
+        self.client.logout()
+        self.assertEqual(self.client.get(status_url).status_code, 404)
+
+    def test_meal_dependents_are_covered(self):
+        # 食事への外部キーを追加したときに、分割削除の対象に加え忘れていないか
+        related = {relation.related_model for relation in Meal._meta.related_objects}
+        self.assertEqual(related, set(deletion.MEAL_DEPENDENTS))
+
+
+# 読み込み専用ビューのレプリカへの振り分け
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('replica', password='password')
+        self.session = SessionStore()
+
+        @read_from_replica
+        def view(request):
+            return HttpResponse(router.db_for_read(Meal))
+        self.view = view
+
+    def make_request(self, method='get'):
+        request = getattr(RequestFactory(), method)('/')
+        request.user = self.user
+        request.session = self.session
+        return request
+
+    def request(self, method='get'):
+        return self.view(self.make_request(method)).content.decode()
+
+    def test_get_reads_from_replica(self):
+        self.assertEqual(self.request(), 'replica')
+        # ビューの外・書き込みはプライマリ
+        self.assertEqual(router.db_for_read(Meal), 'default')
+        self.assertEqual(router.db_for_write(Meal), 'default')
+
+    @override_settings(DATABASE_REPLICAS=['replica1', 'replica2', 'replica3'])
+    def test_one_replica_per_request(self):
+        @read_from_replica
+        def view(request):
+            return HttpResponse(','.join(router.db_for_read(Meal) for _ in range(20)))
+
+        for _ in range(5):
+            aliases = set(view(self.make_request()).content.decode().split(','))
+            self.assertEqual(len(aliases), 1)
+
+    def test_post_reads_from_primary(self):
+        self.assertEqual(self.request('post'), 'default')
+
+    def test_pinned_after_write_request(self):
+        ReplicaPinMiddleware(lambda request: HttpResponse())(self.make_request('post'))
+        self.assertEqual(self.request(), 'default')
+        # 期限が過ぎればレプリカに戻る
+        self.session[REPLICA_PIN_KEY] = int(time.time()) - 1
+        self.assertEqual(self.request(), 'replica')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        self.assertEqual(self.request(), 'default')
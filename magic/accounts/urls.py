@@ -1,6 +1,7 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import async_views, views
 
 
 
@@ -31,10 +32,49 @@ urlpatterns = [
     path('logout_complete/', views.logout_complete, name='logout_complete'),
     path('submit_meal_data/', views.submit_meal_data, name='submit_meal_data'),
     path('edit-meal/<int:meal_id>/', views.edit_meal, name='edit_meal'),
+    path('api/calories/', views.calories_by_range, name='calories_by_range'),
     path('api/calories/<int:year>/', views.calories_by_year, name='calories_by_year'),
+    path('api/calories/<int:year>/<int:month>/', views.calories_by_month, name='calories_by_month'),
     path('password_changed/', views.password_changed, name='password_changed'),
     path('meal/confirm-delete/<int:meal_id>/', views.confirm_delete_meal, name='confirm_delete_meal'),
     path('meal/delete/<int:meal_id>/', views.delete_meal, name='delete_meal'),
     path('meal/delete/complete/', views.delete_meal_complete, name='delete_meal_complete'),
+    path('meals/history/', views.meal_history, name='meal_history'),
+    path('api/meals/history/', views.meal_history_api, name='meal_history_api'),
+    path('api/meals/<int:meal_id>/revisions/', views.meal_revisions, name='meal_revisions'),
+    path('meals/import/', views.import_meals, name='import_meals'),
+    path('meals/export/', views.export_meals, name='export_meals'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('api/foods/search/', views.search_foods, name='search_foods'),
+    path('api/foods/frequent/', views.frequent_foods, name='frequent_foods'),
+    path('api/foods/frequent/forget/', views.forget_frequent_food, name='forget_frequent_food'),
+    path('api/meals/quick-add/', views.quick_add_meal, name='quick_add_meal'),
+    path('meals/batch/', views.batch_add_meals, name='batch_add_meals'),
+    path('trends/', views.trends, name='trends'),
+    path('api/trends/', views.trends_api, name='trends_api'),
+    path('api/meals/batch/', views.batch_add_meals_api, name='batch_add_meals_api'),
+    path('api/jobs/<int:job_id>/', views.job_status, name='job_status'),
 ]
 
+# ACCOUNTS_ASYNC_VIEWS を有効にした場合（ASGI で動かすときの選択肢）は読み込み中心のビューを非同期版に差し替える
+ASYNC_VIEWS = {
+    'home': async_views.home,
+    'enter_meal_data': async_views.enter_meal_data,
+    'calories_by_year': async_views.calories_by_year,
+    'calories_by_range': async_views.calories_by_range,
+    'calories_by_month': async_views.calories_by_month,
+}
+
+
+def with_async_views(patterns):
+    return [
+        path(str(pattern.pattern), ASYNC_VIEWS[pattern.name], name=pattern.name)
+        if pattern.name in ASYNC_VIEWS else pattern
+        for pattern in patterns
+    ]
+
+
+# 同期版の URL 設定（負荷試験で非同期版と比べるため残しておく）
+sync_urlpatterns = urlpatterns
+if settings.ACCOUNTS_ASYNC_VIEWS:
+    urlpatterns = with_async_views(sync_urlpatterns)
@@ -1,29 +1,41 @@
-from datetime import date, datetime
+import calendar
+from datetime import date, datetime, timedelta
+import hashlib
+import json
 import logging
 
+from django.conf import settings
+
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import authenticate, login, logout, update_session_auth_hash
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import PasswordChangeForm
 from django.db import IntegrityError, transaction
-from django.db.models import Sum
-from django.http import HttpResponse, JsonResponse, HttpRequest
+from django.http import HttpResponse, JsonResponse, HttpRequest, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 
+from django.utils.cache import get_conditional_response
 from django.utils.dateparse import parse_date
+from django.utils.http import http_date, quote_etag
 from django.utils.safestring import mark_safe
 from django.views.decorators.http import require_http_methods
 
-from .forms import LoginForm, MealForm, RegistrationForm, UserProfileForm, UserForm
-from .models import Meal, UserProfile, RelatedData
+from . import food_search, jobs, meal_io, pages
+from .caches import dashboard_version, get_calendar_year, get_trends
+from .forms import LoginForm, MealForm, MealFormSet, RegistrationForm, UserProfileForm, UserForm
+from .metrics import registry as metrics_registry
+from .models import Meal, UserProfile, RelatedData, DailyCalorieTotal, FoodFrequency, Job, MealRevision
+from .pagination import InvalidCursor, meal_history_page
+from .routers import read_from_replica
 from django.http import HttpResponseRedirect
 from django.urls import reverse
 
 logger = logging.getLogger('accounts')
 # 最初のページ
 def index(request):
-    return render(request, 'index.html')
+    return pages.static_page(request, 'index.html')
 # 新規登録画面
 
 def register(request):
@@ -52,39 +64,115 @@ def register(request):
     return render(request, 'registration/register.html', {'form': form})
 
 def registration_complete(request):
-    return render(request, 'registration/registration_complete.html')
+    return pages.static_page(request, 'registration/registration_complete.html')
 
 # ホーム画面
 @login_required
+@read_from_replica
 def home(request):
     # ログインしている場合はユーザー情報を取得
     user_info = request.user
-    meals = Meal.objects.all()
+    context = _home_context(user_info, dashboard_version(user_info.pk))
+    return render(request, 'home.html', context)
 
-    # 最新の食事データを取得
-    latest_meals = Meal.objects.filter(user=request.user).order_by('-eaten_at')[:5]
 
-    context = {
+def _home_context(user_info, version):
+    today = date.today()
+    # ダッシュボードの各部分はユーザーごとのバージョン付きでテンプレート側でキャッシュする。
+    # 食事データは遅延評価にしておき、キャッシュがないときだけ読み込む
+    return {
         'user_info': user_info,
-        'latest_meals': latest_meals,
+        'today': today,
+        'target_calories': user_info.profile.target_calories,
+        'dashboard_version': version,
+        'dashboard_timeout': settings.DASHBOARD_CACHE_TIMEOUT,
+        # 最新の食事データ（Meta.ordering の日付・時間の新しい順）
+        'latest_meals': Meal.objects.filter(user=user_info)[:5],
+        'today_total': lambda: DailyCalorieTotal.objects.total_for(user_info, today),
+        'week_summary': lambda: _week_summary(user_info, today),
     }
-    return render(request, 'home.html', context)
-# カロリー計算式
-def calculate_target_calories(age, gender):
-    if gender == 'M':
-        if age <= 30:
-            return 2400
-        elif age <= 50:
-            return 2200
-        else:
-            return 2000
-    else:  # 女性の場合
-        if age <= 30:
-            return 2000
-        elif age <= 50:
-            return 1800
-        else:
-            return 1600
+
+
+# 直近7日間の日ごとの合計カロリー
+def _week_summary(user, today):
+    start = today - timedelta(days=6)
+    totals = dict(
+        DailyCalorieTotal.objects.filter(user=user, date__range=(start, today)).values_list('date', 'total')
+    )
+    target = user.profile.target_calories
+    return [
+        {'date': day, 'total': totals.get(day, 0), 'over': totals.get(day, 0) > target}
+        for day in (start + timedelta(days=offset) for offset in range(7))
+    ]
+
+
+# 食品カタログの検索API（食事入力画面でのカロリーの自動入力に使う）
+# ?q=検索語&limit=件数。前方一致のあと、部分一致・入力の誤りを許した候補を返す
+@login_required
+def search_foods(request):
+    query = request.GET.get('q', '')
+    try:
+        limit = max(1, int(request.GET.get('limit', food_search.SEARCH_LIMIT)))
+    except ValueError:
+        limit = food_search.SEARCH_LIMIT
+    return JsonResponse({'results': food_search.search_foods(query, limit)})
+
+
+# よく食べる食品のAPI（回数と新しさの順。ふだんのカロリーと食事の種類つき）
+@login_required
+def frequent_foods(request):
+    try:
+        limit = min(max(1, int(request.GET.get('limit', settings.FREQUENT_FOODS_LIMIT))), 50)
+    except ValueError:
+        limit = settings.FREQUENT_FOODS_LIMIT
+    foods = FoodFrequency.objects.top(request.user, limit).values(
+        'food_name', 'meal_type', 'calories', 'count', 'last_eaten'
+    )
+    return JsonResponse({'results': list(foods)})
+
+
+# よく食べる食品の候補から外すAPI（POST food_name）
+# 食事の編集・削除は集計に反映しないので、削除した食事や入力を誤った食品はここで消す。
+# もう一度その食品を追加すると、また候補に入る
+@login_required
+@require_http_methods(["POST"])
+def forget_frequent_food(request):
+    deleted, _ = FoodFrequency.objects.filter(user=request.user, food_name=request.POST.get('food_name', '')).delete()
+    if not deleted:
+        return JsonResponse({'error': '候補にない食品です'}, status=404)
+    return JsonResponse({'deleted': True})
+
+
+# 食事をワンクリックで追加するAPI（画面を描画せず JSON で結果を返す）
+# 日付・時間を省略すると現在の日時で登録する
+@login_required
+@require_http_methods(["POST"])
+def quick_add_meal(request):
+    now = datetime.now()
+    data = request.POST.copy()
+    if not data.get('date'):
+        data['date'] = now.date().isoformat()
+    if not data.get('eaten_at'):
+        data['eaten_at'] = now.strftime('%H:%M')
+    form = MealForm(data)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+
+    meal = form.save(commit=False)
+    meal.user = request.user
+    with transaction.atomic():
+        meal.save()
+        total_calories = DailyCalorieTotal.objects.total_for(request.user, meal.date)
+    target_calories = request.user.profile.target_calories
+    return JsonResponse({
+        'id': meal.id,
+        'food_name': meal.food_name,
+        'date': meal.date,
+        'total_calories': total_calories,
+        'target_calories': target_calories,
+        'over_target': total_calories > target_calories,
+    }, status=201)
+
 
 # アカウント削除確認画面
 @login_required
@@ -102,29 +190,47 @@ def delete_account(request):
     else:
         return redirect('delete_confirmation')
 # アカウント削除進行画面
+# 削除はバックグラウンド処理 (run_worker) で行い、この画面は進み具合を問い合わせて完了を待つ
 @login_required
 def delete_in_progress(request):
     user = request.user
+    # 削除が終わるまでログインできないようにしてから、削除を依頼してログアウトする
+    user.is_active = False
+    user.save(update_fields=['is_active'])
+    job = jobs.enqueue('delete_user', {'user_id': user.pk}, user=user)
+    logger.debug(f'User deletion queued: {user.username} ({job})')
+    logout(request)
 
-    # ユーザーの削除前に関連する UserProfile を削除
-    try:
-        if hasattr(user, 'userprofile'):
-            user.userprofile.delete()
-            logger.debug(f'UserProfile deleted for user: {user.username}')
-    except Exception as e:
-        logger.error(f'Error deleting UserProfile for user: {user.username}. Error: {e}')
-
-    user.delete()
-    logger.debug(f'User deleted: {user.username}')
+    request.session['deletion_job_id'] = job.pk
     request.session['account_deleted'] = True
-    redirect_url = reverse('delete_completed')
     return render(request, 'delete_in_progress.html', {
-        'redirect_url': mark_safe(redirect_url)
+        'status_url': reverse('job_status', args=[job.pk]),
+        'redirect_url': mark_safe(reverse('delete_completed')),
     })
+
+
+# バックグラウンド処理の状態を返すAPI（依頼したユーザーか、削除を依頼したセッションだけが見られる）
+def job_status(request, job_id):
+    job = get_object_or_404(Job, pk=job_id)
+    is_owner = request.user.is_authenticated and job.user_id == request.user.pk
+    if not is_owner and request.session.get('deletion_job_id') != job.pk:
+        return JsonResponse({'error': 'not found'}, status=404)
+    return JsonResponse({
+        'id': job.pk,
+        'name': job.name,
+        'status': job.status,
+        'progress': job.progress,
+        'result': job.result,
+        'attempts': job.attempts,
+        'finished': job.status in (Job.SUCCEEDED, Job.FAILED),
+    })
+
+
 # アカウント削除完了画面
 def delete_completed(request):
     if request.session.pop('account_deleted', None):
-        return render(request, 'delete_completed.html')
+        request.session.pop('deletion_job_id', None)
+        return pages.static_page(request, 'delete_completed.html')
     else:
         return redirect('home')
  # ログアウト画面
@@ -135,7 +241,7 @@ def user_logout(request):
 
 def logout_complete(request):
     # 'log_out.html'を指定してレンダリング
-    return render(request, 'logout_complete.html')
+    return pages.static_page(request, 'logout_complete.html')
 
 # ログイン画面
 def user_login(request):
@@ -162,8 +268,8 @@ def user_login(request):
 # 食事追加画面
 @login_required
 def add_meal(request):
-    user_profile = UserProfile.objects.get(user=request.user)
-    target_calories = calculate_target_calories(user_profile.age, user_profile.gender)
+    # プロフィールは認証時に select_related で読み込み済み（accounts.backends）
+    target_calories = request.user.profile.target_calories
 
     today = date.today()  # 今日の日付を取得
     selected_date = today  # デフォルト日付を今日に設定
@@ -178,9 +284,8 @@ def add_meal(request):
             try:
                 with transaction.atomic():
                     meal.save()
-                    # 選択された日付での食事を取得してカロリーを計算
-                    meals_on_date = Meal.objects.filter(date=selected_date, user=request.user)
-                    total_calories = sum(meal.calories for meal in meals_on_date)
+                    # 選択された日付の合計カロリーを日別集計から取得
+                    total_calories = DailyCalorieTotal.objects.total_for(request.user, selected_date)
 
                     if total_calories > target_calories:
                         return redirect('calorie_warning')
@@ -193,14 +298,15 @@ def add_meal(request):
     else:
         meal_form = MealForm(initial={'date': today})  # 初期値として今日の日付を設定
 
-    meals_on_date = Meal.objects.filter(date=selected_date, user=request.user)
-    total_calories = sum(meal.calories for meal in meals_on_date)
+    total_calories = DailyCalorieTotal.objects.total_for(request.user, selected_date)
 
     context = {
         'meal_form': meal_form,
         'target_calories': target_calories,
         'total_calories': total_calories,
-        'selected_date': selected_date
+        'selected_date': selected_date,
+        # よく食べる食品（ワンクリックで追加できるボタンにする）
+        'frequent_foods': FoodFrequency.objects.top(request.user, settings.FREQUENT_FOODS_LIMIT),
     }
     return render(request, 'add_meal.html', context)
 
@@ -208,11 +314,11 @@ def add_meal(request):
 # カロリー警告画面
 @login_required
 def calorie_warning(request):
-    return render(request, 'calorie_warning.html')
+    return pages.static_page(request, 'calorie_warning.html')
 # 食事追加成功画面
 @login_required
 def success(request):
-    return render(request, 'success.html')
+    return pages.static_page(request, 'success.html')
 
 # プロフィール編集画面
 @login_required
@@ -277,13 +383,13 @@ def change_password(request):
 # パスワード変更完了画面
 @login_required
 def password_changed(request):
-    return render(request, 'password_changed.html')
+    return pages.static_page(request, 'password_changed.html')
 
 
 # プロフィール更新完了画面
 @login_required
 def update_complete(request):
-    return render(request, 'update_complete.html')
+    return pages.static_page(request, 'update_complete.html')
 
 def selected_date(request):
     # 選択された日付を取得する
@@ -294,7 +400,9 @@ def selected_date(request):
 @login_required
 def edit_meal(request, meal_id):
     meal = get_object_or_404(Meal, id=meal_id, user=request.user)
-    request.session['updated_meal_id'] = meal.id
+    # 値が変わらないときはセッションを書き換えない（保存が発生しないように）
+    if request.session.get('updated_meal_id') != meal.id:
+        request.session['updated_meal_id'] = meal.id
     form = MealForm(instance=meal)
     # 日付情報をURLに含める
     meal_date = meal.date.isoformat() if meal.date else None
@@ -302,7 +410,7 @@ def edit_meal(request, meal_id):
     if request.method == 'POST':
         form = MealForm(request.POST, instance=meal)
         if form.is_valid():
-            form.save()
+            meal_io.save_meal_edit(form)
             messages.success(request, "食事情報が更新されました。")
             return redirect(meal_history_url)
         else:
@@ -326,15 +434,12 @@ def edit_complete(request):
     if request.method == 'POST':
         form = MealForm(request.POST, instance=meal)
         if form.is_valid():
-            form.save()
-            meal.refresh_from_db()  # データベースから最新のデータを取得
+            # 保存した値はそのまま meal に入っているので、データベースから読み直さない
+            meal, _ = meal_io.save_meal_edit(form)
             messages.success(request, "食事情報が更新されました。")
 
-            # 関連データの更新
-            related_data_qs = RelatedData.objects.filter(meal=meal)
-            for related_data in related_data_qs:
-                related_data.additional_info = '更新された情報'
-                related_data.save()
+            # 関連データの更新（1回の UPDATE でまとめて更新する）
+            RelatedData.objects.filter(meal=meal).update(additional_info='更新された情報')
 
             # redirect_url の生成
             redirect_url = reverse('enter_meal_data') + f'?selected_date={meal.date.isoformat()}'
@@ -374,8 +479,9 @@ def confirm_delete_meal(request, meal_id):
 @login_required
 def delete_meal(request, meal_id):
     meal = get_object_or_404(Meal, id=meal_id, user=request.user)
-    request.session['last_viewed_date'] = meal.date.isoformat()  
     if request.method == 'POST':
+        if request.session.get('last_viewed_date') != meal.date.isoformat():
+            request.session['last_viewed_date'] = meal.date.isoformat()
         meal.delete()
         messages.success(request, "食事データが削除されました。")
         return redirect('delete_meal_complete')  # 削除完了画面にリダイレクト
@@ -393,6 +499,7 @@ def delete_meal_complete(request):
 
 # 追加したデータを確認する画面
 @login_required
+@read_from_replica
 def enter_meal_data(request):
     selected_date_str = request.GET.get('selected_date', None)
     selected_date = parse_date(selected_date_str) if selected_date_str else None
@@ -409,7 +516,8 @@ def enter_meal_data(request):
         form = MealForm(initial={'date': selected_date})
 
     meals = Meal.objects.filter(date=selected_date, user=request.user) if selected_date else []
-    total_calories = sum(meal.calories for meal in meals)  # 合計カロリーを計算
+    # 合計カロリーは日別集計から取得
+    total_calories = DailyCalorieTotal.objects.total_for(request.user, selected_date) if selected_date else 0
 
 
     return render(request, 'enter_meal_data.html', {
@@ -446,29 +554,303 @@ def submit_meal_data(request: HttpRequest) -> HttpResponse:
     return HttpResponse("Invalid request", status=400)
 
 
+# 食事履歴画面（キーセットページング）
+@login_required
+@read_from_replica
+def meal_history(request):
+    try:
+        meals, next_cursor = meal_history_page(request.user, request.GET.get('cursor'), _history_page_size(request))
+    except InvalidCursor:
+        return redirect('meal_history')
+    return render(request, 'meal_history.html', {'meals': meals, 'next_cursor': next_cursor})
+
+
+# 食事履歴API（?cursor= で続きを取得、?limit= で件数を指定）
+@login_required
+@read_from_replica
+def meal_history_api(request):
+    try:
+        meals, next_cursor = meal_history_page(request.user, request.GET.get('cursor'), _history_page_size(request))
+    except InvalidCursor:
+        return JsonResponse({'error': 'カーソルが正しくありません。'}, status=400)
+    return JsonResponse({
+        'meals': [
+            {
+                'id': meal.id,
+                'date': meal.date.isoformat(),
+                'eaten_at': meal.eaten_at.isoformat(),
+                'meal_type': meal.meal_type,
+                'food_name': meal.food_name,
+                'calories': meal.calories,
+            } for meal in meals
+        ],
+        'next_cursor': next_cursor,
+    })
+
+
+# 食事の編集履歴API（新しい順。changes は {項目: [変更前, 変更後]}）
+@login_required
+@read_from_replica
+def meal_revisions(request, meal_id):
+    meal = get_object_or_404(Meal.objects.only('id'), id=meal_id, user=request.user)
+    revisions = MealRevision.objects.filter(meal=meal).order_by('-created_at', '-id').values('created_at', 'changes')
+    return JsonResponse({'meal_id': meal.id, 'revisions': list(revisions)})
+
+
+# 傾向分析画面
+@login_required
+def trends(request):
+    return render(request, 'trends.html', {'target_calories': request.user.profile.target_calories})
+
+
+# 傾向分析API（?period=30d / 90d / 1y / 10y）
+@login_required
+@read_from_replica
+def trends_api(request):
+    try:
+        from . import analytics
+    except ImportError:
+        return JsonResponse({'error': '傾向分析には numpy が必要です。'}, status=503)
+    period = request.GET.get('period', '30d')
+    if period not in analytics.TREND_PERIODS:
+        return JsonResponse({'error': f"period は {', '.join(analytics.TREND_PERIODS)} のいずれかを指定してください。"}, status=400)
+
+    today = date.today()
+    body = get_trends(
+        request.user.pk, period, today,
+        lambda: json.dumps(analytics.user_trends(request.user, period, today), separators=(',', ':')),
+    )
+    return HttpResponse(body, content_type='application/json')
+
+
+def _history_page_size(request):
+    try:
+        limit = int(request.GET.get('limit', settings.MEAL_HISTORY_PAGE_SIZE))
+    except ValueError:
+        limit = settings.MEAL_HISTORY_PAGE_SIZE
+    return min(max(limit, 1), settings.MEAL_HISTORY_MAX_PAGE_SIZE)
+
+
+# ビューごとの計測値（Prometheus のテキスト形式、スタッフのみ）
+@staff_member_required
+def metrics(request):
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# 複数の食事をまとめて入力する画面
+# すべての行を検証してから1回の bulk_create で保存し、日付ごとに目標カロリーとの比較を表示する
+@login_required
+def batch_add_meals(request):
+    statuses = None
+    # 各行の日付の初期値は今日（日付以外が空の行は空の行として無視される）
+    form_kwargs = {'initial': {'date': date.today()}}
+    if request.method == 'POST':
+        formset = MealFormSet(request.POST, form_kwargs=form_kwargs)
+        if formset.is_valid():
+            forms = [form for form in formset if form.has_changed()]
+            if forms:
+                statuses = meal_io.save_meal_forms(request.user, forms)
+                # 再読み込みで同じ食事を二重に登録しないよう、結果はセッションに入れてリダイレクトする
+                request.session['batch_statuses'] = [
+                    dict(status, date=status['date'].isoformat()) for status in statuses
+                ]
+                return redirect('batch_add_meals')
+            else:
+                messages.error(request, '食事を1件以上入力してください。')
+        else:
+            messages.error(request, '入力に問題があります。詳細を確認してください。')
+    else:
+        formset = MealFormSet(form_kwargs=form_kwargs)
+        statuses = request.session.pop('batch_statuses', None)
+        for status in statuses or []:
+            status['date'] = parse_date(status['date'])
+    return render(request, 'batch_add_meals.html', {'formset': formset, 'statuses': statuses})
+
+
+# 複数の食事をまとめて登録するAPI（JSON の {"meals": [...]} または配列を送信）
+# 1件でも不正な行があれば何も保存せず、行ごとのエラーを返す
+@login_required
+@require_http_methods(["POST"])
+def batch_add_meals_api(request):
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'JSON を送信してください。'}, status=400)
+    rows = payload.get('meals') if isinstance(payload, dict) else payload
+    if not isinstance(rows, list) or not rows:
+        return JsonResponse({'error': 'meals に食事の配列を指定してください。'}, status=400)
+    if len(rows) > settings.MEAL_BATCH_MAX_SIZE:
+        return JsonResponse({'error': f'一度に登録できるのは {settings.MEAL_BATCH_MAX_SIZE} 件までです。'}, status=400)
+
+    forms = [MealForm(data=row) if isinstance(row, dict) else None for row in rows]
+    errors = [
+        {'index': index, 'errors': form.errors if form is not None else {'__all__': ['行を読み取れません。']}}
+        for index, form in enumerate(forms)
+        if form is None or not form.is_valid()
+    ]
+    if errors:
+        return JsonResponse({'errors': errors}, status=400)
+
+    statuses = meal_io.save_meal_forms(request.user, forms)
+    return JsonResponse({'created': len(forms), 'days': statuses}, status=201)
+
+
+# 食事データの一括インポート（CSV / JSON Lines のファイルを file で送信）
+@login_required
+@require_http_methods(["POST"])
+def import_meals(request):
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'error': 'ファイルを選択してください。'}, status=400)
+    file_format = request.POST.get('format') or meal_io.guess_format(upload.name)
+    if file_format not in ('csv', 'jsonl'):
+        return JsonResponse({'error': 'CSV または JSON Lines のファイルを指定してください。'}, status=400)
+
+    file_error = meal_io.check_file(upload.file, file_format)
+    if file_error is not None:
+        return JsonResponse(dict(file_error, created=0), status=400)
+
+    result = meal_io.import_meals(request.user, meal_io.iter_rows(upload.file, file_format))
+    logger.info(f"Meals imported for user {request.user.username}: {result['created']} created, {result['error_count']} errors")
+    succeeded = 'file_error' not in result and (result['created'] or not result['error_count'])
+    return JsonResponse(result, status=200 if succeeded else 400)
+
+
+# 食事データのエクスポート（?format=csv または jsonl）
+@login_required
+def export_meals(request):
+    file_format = request.GET.get('format', 'csv')
+    if file_format == 'jsonl':
+        response = StreamingHttpResponse(meal_io.export_jsonl(request.user), content_type='application/x-ndjson; charset=utf-8')
+    elif file_format == 'csv':
+        response = StreamingHttpResponse(meal_io.export_csv(request.user), content_type='text/csv; charset=utf-8')
+    else:
+        return JsonResponse({'error': 'format は csv または jsonl を指定してください。'}, status=400)
+    response['Content-Disposition'] = f'attachment; filename="meals.{file_format}"'
+    return response
+
+
 # カロリー超過場合カレンダーに色をつける
+@login_required
+@read_from_replica
 def calories_by_year(request, year):
-    start_date = parse_date(f"{year}-01-01")
-    end_date = parse_date(f"{year}-12-31")
-    meals = Meal.objects.filter(date__range=(start_date, end_date), user=request.user)
+    if not date.min.year <= year <= date.max.year:
+        return _year_out_of_range()
+    entry = _calendar_year(request.user, year)
+    return _conditional_json(request, entry['etag'], entry['last_modified'], lambda: _year_body(entry))
 
-    # ユーザープロファイルから年齢と性別を直接取得
-    user_profile = UserProfile.objects.get(user=request.user)
-    age = user_profile.age  # 年齢フィールドの名前は仮定
-    gender = user_profile.gender  # 性別
 
-    required_calories = calculate_target_calories(age, gender)
+def _year_out_of_range():
+    return JsonResponse({'error': f'年は {date.min.year}〜{date.max.year} で指定してください。'}, status=400)
 
-    calories_data = meals.values('date').annotate(total_calories=Sum('calories')).order_by('date')
 
+def _year_body(entry):
+    start = date(entry['data']['year'], 1, 1)
+    required_calories = entry['data']['requiredCalories']
     response_data = {
-        meal['date'].strftime('%Y-%m-%d'): {
-            'calories': meal['total_calories'],
+        (start + timedelta(days=offset)).strftime('%Y-%m-%d'): {
+            'calories': total,
             'requiredCalories': required_calories
-        } for meal in calories_data
+        } for offset, total in enumerate(entry['data']['totals']) if total is not None
     }
-
-    return JsonResponse(response_data)
-
+    return json.dumps(response_data)
 
 
+# 期間指定のカレンダーAPI（?from=YYYY-MM-DD&to=YYYY-MM-DD）
+# 開始日・日ごとの合計カロリーの配列・目標カロリー（1回だけ）の列形式で返す
+@login_required
+@read_from_replica
+def calories_by_range(request):
+    start = parse_date(request.GET.get('from') or '')
+    end = parse_date(request.GET.get('to') or '')
+    if start is None or end is None or start > end:
+        return JsonResponse({'error': 'from と to を YYYY-MM-DD 形式で指定してください。'}, status=400)
+    if (end - start).days >= settings.CALENDAR_RANGE_MAX_DAYS:
+        return JsonResponse({'error': f'期間は {settings.CALENDAR_RANGE_MAX_DAYS} 日以内で指定してください。'}, status=400)
+    return _calories_columnar(request, start, end)
+
+
+# 月単位のカレンダーAPI（カレンダーを月ごとに読み込むため）
+@login_required
+@read_from_replica
+def calories_by_month(request, year, month):
+    if not date.min.year <= year <= date.max.year:
+        return _year_out_of_range()
+    if not 1 <= month <= 12:
+        return JsonResponse({'error': '月は 1〜12 で指定してください。'}, status=400)
+    start = date(year, month, 1)
+    end = date(year, month, calendar.monthrange(year, month)[1])
+    return _calories_columnar(request, start, end)
+
+
+def _calories_columnar(request, start, end):
+    # 年ごとのキャッシュを切り出してつなげる
+    entries = [_calendar_year(request.user, year) for year in range(start.year, end.year + 1)]
+    return _columnar_response(request, start, end, entries)
+
+
+def _columnar_response(request, start, end, entries):
+    etag = hashlib.md5(
+        f"{start}:{end}:{':'.join(entry['etag'] for entry in entries)}".encode()
+    ).hexdigest()
+    last_modified = max(entry['last_modified'] for entry in entries)
+
+    def build_body():
+        totals = []
+        for entry in entries:
+            year_start = date(entry['data']['year'], 1, 1)
+            first = max((start - year_start).days, 0)
+            last = (min(end, date(entry['data']['year'], 12, 31)) - year_start).days
+            # 食事のない日 (None) は 0 にする
+            totals.extend(total or 0 for total in entry['data']['totals'][first:last + 1])
+        return json.dumps({
+            'start': start.isoformat(),
+            'totals': totals,
+            'requiredCalories': entries[0]['data']['requiredCalories'],
+        }, separators=(',', ':'))
+
+    return _conditional_json(request, etag, last_modified, build_body)
+
+
+def _conditional_json(request, etag, last_modified, build_body):
+    # ブラウザのキャッシュが最新なら 304 を返して本文の生成と転送を省略する
+    etag = quote_etag(etag)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(build_body(), content_type='application/json')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _calendar_year(user, year):
+    return get_calendar_year(user.pk, year, lambda: _build_calendar_year(user, year))
+
+
+def _build_calendar_year(user, year):
+    return _calendar_year_data(user, year, _calendar_year_rows(user, year))
+
+
+def _calendar_year_rows(user, year):
+    # 日別集計から1日1行だけ読み込む
+    daily_totals = DailyCalorieTotal.objects.filter(date__range=(date(year, 1, 1), date(year, 12, 31)), user=user)
+    return daily_totals.values_list('date', 'total').order_by('date')
+
+
+def _calendar_year_data(user, year, rows):
+    # 1年分の日ごとの合計カロリーを1月1日から並べた配列にする
+    # 集計行のない日は None にして、合計 0 kcal の食事だけの日と区別する（年単位のAPIでは後者も返す）
+    start_date = date(year, 1, 1)
+    end_date = date(year, 12, 31)
+    totals = [None] * ((end_date - start_date).days + 1)
+    for day, total in rows:
+        totals[(day - start_date).days] = total
+
+    required_calories = user.profile.target_calories
+
+    return {
+        'year': year,
+        'totals': totals,
+        'requiredCalories': required_calories,
+    }
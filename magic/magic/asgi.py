@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "magic.settings")
 
 application = get_asgi_application()
+
+# テンプレートの解析・固定ページの描画・食品検索の索引の作成を最初のリクエストの前に済ませておく
+from accounts.food_search import warm_index
+from accounts.pages import warm_templates
+
+warm_templates()
+warm_index()
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 
 from pathlib import Path
 import os
+from django.core.exceptions import ImproperlyConfigured
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 TEMPLATE_DIR = os.path.join(BASE_DIR,'templates')
@@ -43,22 +44,36 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "django.contrib.sessions.middleware.SessionMiddleware",
+    "accounts.middleware.StaticAssetMiddleware",
+    "accounts.middleware.QueryMetricsMiddleware",
+    "accounts.middleware.SessionRefreshMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "accounts.middleware.ReplicaPinMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
 ROOT_URLCONF = "magic.urls"
 
+# テンプレートは初回に読み込んで解析した結果をプロセス内に保持する (cached.Loader)。
+# 固定ページ (accounts.pages.STATIC_PAGES) の描画結果も使い回す。
+# テンプレートを編集しながら確認するときは MAGIC_TEMPLATE_CACHE=0 で毎回読み込む
+TEMPLATE_CACHE = os.environ.get('MAGIC_TEMPLATE_CACHE', '1') == '1'
+TEMPLATE_LOADERS = [
+    "django.template.loaders.filesystem.Loader",
+    "django.template.loaders.app_directories.Loader",
+]
+if TEMPLATE_CACHE:
+    TEMPLATE_LOADERS = [("django.template.loaders.cached.Loader", TEMPLATE_LOADERS)]
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
         "DIRS": [TEMPLATE_DIR],
-        "APP_DIRS": True,
         "OPTIONS": {
+            "loaders": TEMPLATE_LOADERS,
             "context_processors": [
                 "django.template.context_processors.debug",
                 "django.template.context_processors.request",
@@ -75,21 +90,53 @@ WSGI_APPLICATION = "magic.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# 接続先は環境変数 MAGIC_DB_* で変更できる（ローカルの MariaDB コンテナで計測するときなど）
+#   docker run --rm -p 3306:3306 -e MARIADB_ROOT_PASSWORD=magic -e MARIADB_DATABASE=magic mariadb:10.11
+#   MAGIC_DB_HOST=127.0.0.1 MAGIC_DB_PORT=3306 MAGIC_DB_USER=root MAGIC_DB_PASSWORD=magic MAGIC_DB_NAME=magic
+# 接続はリクエストをまたいで使い回す (CONN_MAX_AGE)。使う前に応答を確認し、切れていればつなぎ直す (CONN_HEALTH_CHECKS)。
+# PythonAnywhere の MySQL は 300 秒使わない接続を切るので、それより少し短くする。
+# MAGIC_DB_POOL=1 でプロセス内の接続プール (accounts.db.mysql_pooled) を使う。
+# sql_mode はサーバーの既定値（ONLY_FULL_GROUP_BY などが含まれることがある）に任せず、接続時に明示する。
+# 接続を使い回すので SET は接続ごとに1回だけ実行される（MAGIC_DB_SQL_MODE で変更できる）
+DB_POOL = os.environ.get('MAGIC_DB_POOL', '0') == '1'
+DB_OPTIONS = {
+    'init_command': f"SET sql_mode='{os.environ.get('MAGIC_DB_SQL_MODE', 'STRICT_TRANS_TABLES')}'",
+}
+if DB_POOL:
+    DB_OPTIONS['pool_size'] = int(os.environ.get('MAGIC_DB_POOL_SIZE', '5'))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'kohei$kohei',  # 使用するデータベース名
-        'USER': 'kohei',  # ユーザー名
-        'PASSWORD': 'qwertyuiopasdfghjklzxcvbnm',  # データベースのパスワード
-        'HOST': 'kohei.mysql.pythonanywhere-services.com',  # データベースホスト
-        'PORT': '', # MySQLのデフォルトポート3306は指定不要
-        'OPTIONS': {
-            'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
-        },
-
+        'ENGINE': 'accounts.db.mysql_pooled' if DB_POOL else 'django.db.backends.mysql',
+        'NAME': os.environ.get('MAGIC_DB_NAME', 'kohei$kohei'),  # 使用するデータベース名
+        'USER': os.environ.get('MAGIC_DB_USER', 'kohei'),  # ユーザー名
+        'PASSWORD': os.environ.get('MAGIC_DB_PASSWORD', 'qwertyuiopasdfghjklzxcvbnm'),  # データベースのパスワード
+        'HOST': os.environ.get('MAGIC_DB_HOST', 'kohei.mysql.pythonanywhere-services.com'),  # データベースホスト
+        'PORT': os.environ.get('MAGIC_DB_PORT', ''),  # MySQLのデフォルトポート3306は指定不要
+        # プールを使う場合はリクエストごとにプールへ戻す
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('MAGIC_DB_CONN_MAX_AGE', '280')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': DB_OPTIONS,
     }
 }
 
+# 読み込み専用レプリカ
+# MAGIC_DB_REPLICA_HOSTS にカンマ区切りでホストを指定すると、@read_from_replica を付けた
+# 読み込みだけのビュー（カレンダー・履歴など）の GET はレプリカから読む（accounts.routers）。
+# 書き込み・ログイン・セッションは常に default。書き込みのリクエストを送ったユーザーは
+# REPLICA_STICKY_SECONDS 秒間 default から読む（レプリカの遅れで変更前の内容を見せない）。期限はセッションに記録する。
+# テスト (accounts.test_runner) ではレプリカを使わず、すべて default のテスト用データベースから読む。
+# ローカルでは MariaDB コンテナをもう1つレプリカとして立てるか、同じホストを指定して確認できる
+DATABASES.update({
+    f'replica{number}': dict(DATABASES['default'], HOST=host.strip(), OPTIONS=dict(DB_OPTIONS), TEST={'MIRROR': 'default'})
+    for number, host in enumerate(filter(None, os.environ.get('MAGIC_DB_REPLICA_HOSTS', '').split(',')), 1)
+})
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['accounts.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.environ.get('MAGIC_DB_REPLICA_STICKY_SECONDS', '10'))
+
+TEST_RUNNER = 'accounts.test_runner.PrimaryOnlyTestRunner'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -110,6 +157,14 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# ログイン中のユーザーをプロフィールと一緒に読み込む
+# ModelBackend も残し、切り替え前にログインしたセッション (BACKEND_SESSION_KEY が ModelBackend) を有効なままにする
+AUTHENTICATION_BACKENDS = [
+    "accounts.backends.ProfileModelBackend",
+    "django.contrib.auth.backends.ModelBackend",
+]
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.1/topics/i18n/
 
@@ -133,15 +188,90 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# collectstatic で CSS を縮小し、内容のハッシュ付きの名前と圧縮版 (.gz/.br) を作る (accounts.storage)
+# 配信は accounts.middleware.StaticAssetMiddleware。古いハッシュ付きのファイルは prune_static コマンドで削除する
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'accounts.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+STATIC_ASSET_MAX_AGE = 60 * 60 * 24 * 365  # ハッシュ付きの静的ファイルをブラウザにキャッシュさせる期間 (秒)
+
+# キャッシュ
+# カレンダー・ダッシュボードのキャッシュは書き込んだプロセスで無効化するので、ワーカー間で共有するファイルベースを既定にする。
+# ローカルメモリはプロセスごとに独立し、他のワーカーが古い内容を返し続けるため、
+# MAGIC_CACHE_BACKEND=locmem は1プロセスで動かす場合（開発サーバーなど）だけに使う。
+CACHE_BACKEND = os.environ.get('MAGIC_CACHE_BACKEND', 'file')
+if CACHE_BACKEND == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'magic',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('MAGIC_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
+        }
+    }
+CALENDAR_CACHE_TIMEOUT = 60 * 60 * 24  # カレンダーAPIのキャッシュ保持時間 (秒)
+CALENDAR_RANGE_MAX_DAYS = 366 * 10  # 期間指定カレンダーAPIで一度に取得できる日数の上限
+DASHBOARD_CACHE_TIMEOUT = 60 * 60 * 24  # ホーム画面のダッシュボード断片のキャッシュ保持時間 (秒)
+TRENDS_CACHE_TIMEOUT = 60 * 60 * 24  # 傾向分析APIのキャッシュ保持時間 (秒)
+
+# 読み込み中心のビュー（ホーム・食事一覧・カレンダーAPI）を非同期版にする（MAGIC_ASYNC_VIEWS=1 で有効）。
+# 計測 (loadtest_accounts) では同期版より遅かったため、ASGI でも既定では同期版を使う
+ACCOUNTS_ASYNC_VIEWS = os.environ.get('MAGIC_ASYNC_VIEWS', '0') == '1'
+
+# よく食べる食品 (accounts.models.FoodFrequency)
+FREQUENT_FOODS_HALF_LIFE_DAYS = 14  # この日数ごとに過去の食事の重みが半分になる
+FREQUENT_FOODS_LIMIT = 10  # 一覧に表示する件数
+
+# バックグラウンド処理 (accounts.jobs, manage.py run_worker)
+JOB_MAX_ATTEMPTS = 3  # 失敗したときに再実行する回数の上限（最初の実行を含む）
+JOB_RETRY_DELAY = 30  # 最初の再実行までの秒数（以降は倍ずつ延ばす）
+JOB_LOCK_TIMEOUT = 60 * 10  # これより長く実行中のままの処理はワーカーが止まったとみなして取り直す (秒)
+JOB_BATCH_SIZE = 1000  # 分割して実行する処理の1回あたりの件数
+
+# 食事のまとめて入力で一度に登録できる件数
+MEAL_BATCH_MAX_SIZE = 100
+
+# 食事履歴の1ページあたりの件数
+MEAL_HISTORY_PAGE_SIZE = 20
+MEAL_HISTORY_MAX_PAGE_SIZE = 100
+
+# ビューごとの計測 (accounts.middleware.QueryMetricsMiddleware)
+METRICS_SAMPLE_RATE = float(os.environ.get('MAGIC_METRICS_SAMPLE_RATE', '0.1'))  # SQL を計測するリクエストの割合
+METRICS_SLOW_REQUEST_MS = 1000  # これより遅いリクエストをログに出す (ミリ秒)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # settings.py
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'  # データベースを使用してセッションを保存
+# セッションの保存先 (MAGIC_SESSION_STORAGE で db / cached_db / signed_cookies を選択)
+# cached_db はキャッシュにもセッションを置くので、ワーカー間で共有するキャッシュ (MAGIC_CACHE_BACKEND=file) のときだけ使える。
+# ローカルメモリでは、ログアウトやパスワード変更が他のワーカーの古い写しに届かない
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_STORAGE = os.environ.get('MAGIC_SESSION_STORAGE', 'db')
+if SESSION_STORAGE == 'cached_db' and CACHE_BACKEND == 'locmem':
+    raise ImproperlyConfigured('MAGIC_SESSION_STORAGE=cached_db はワーカー間で共有するキャッシュ (MAGIC_CACHE_BACKEND=file) と一緒に使ってください')
+SESSION_ENGINE = SESSION_ENGINES[SESSION_STORAGE]
 SESSION_COOKIE_AGE = 1209600  # 2週間 (単位は秒)
-SESSION_SAVE_EVERY_REQUEST = True  # セッションを毎回保存する
+# セッションは内容が変わったときだけ保存し、有効期限の延長は SESSION_REFRESH_INTERVAL ごとに行う
+# (accounts.middleware.SessionRefreshMiddleware)
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_REFRESH_INTERVAL = 60 * 60 * 24  # 1日 (単位は秒)
 import os
 import logging
 import logging.handlers
@@ -179,6 +309,12 @@ LOGGING = {
             'level': 'INFO',  # INFOレベル以上のログを表示
             'propagate': True,
         },
+        # アプリのログ（遅いリクエスト・バックグラウンド処理の失敗など）
+        'accounts': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': True,
+        },
     },
 }
 # settings.py
@@ -0,0 +1,209 @@
+// ホーム画面のカレンダー
+// - 12か月分の枠は <template> を複製して一度に作り、日ごとのカロリーは画面に入った月だけ月別APIから取得する
+// - 取得結果は ETag と一緒に localStorage に保存し、次に開いたときは通信を待たずに保存済みの内容で描画する
+// - 再取得した結果は保存済みの内容と比べ、変わった日のセルだけを書き換える
+
+const STORAGE_PREFIX = 'calendar:v1';
+const WEEKDAYS = ['日', '月', '火', '水', '木', '金', '土'];
+
+function pad(number) {
+    return number.toString().padStart(2, '0');
+}
+
+function storageKey(userId, year, month) {
+    return `${STORAGE_PREFIX}:${userId}:${year}-${pad(month)}`;
+}
+
+function loadCached(key) {
+    try {
+        return JSON.parse(localStorage.getItem(key));
+    } catch (error) {
+        return null;
+    }
+}
+
+function saveCached(key, entry) {
+    try {
+        localStorage.setItem(key, JSON.stringify(entry));
+    } catch (error) {
+        // 容量不足やプライベートモードでは保存しない（毎回取得するだけ）
+    }
+}
+
+class MonthView {
+    constructor(calendar, year, month) {
+        this.calendar = calendar;
+        this.year = year;
+        this.month = month;
+        this.key = storageKey(calendar.userId, year, month);
+        this.entry = null;
+        this.loading = null;
+        this.cells = [];
+        this.element = this.build();
+    }
+
+    build() {
+        const element = this.calendar.monthTemplate.content.firstElementChild.cloneNode(true);
+        element.querySelector('h2').textContent = `${this.year}年 ${this.month}月`;
+        const headerRow = element.querySelector('thead tr');
+        for (const weekday of WEEKDAYS) {
+            const cell = document.createElement('th');
+            cell.textContent = weekday;
+            headerRow.appendChild(cell);
+        }
+
+        const body = element.querySelector('tbody');
+        const firstWeekday = new Date(this.year, this.month - 1, 1).getDay();
+        const daysInMonth = new Date(this.year, this.month, 0).getDate();
+        let row = null;
+        for (let slot = 0; slot < firstWeekday + daysInMonth; slot++) {
+            if (slot % 7 === 0) {
+                row = body.insertRow();
+            }
+            const cell = row.insertCell();
+            const day = slot - firstWeekday + 1;
+            if (day < 1) {
+                continue;
+            }
+            const link = document.createElement('a');
+            link.href = `${this.calendar.enterMealUrl}?selected_date=${this.year}-${pad(this.month)}-${pad(day)}`;
+            link.textContent = day;
+            cell.appendChild(link);
+            this.cells.push(cell);
+        }
+        while (row.cells.length < 7) {
+            row.insertCell();
+        }
+        return element;
+    }
+
+    // 保存済みの内容があれば通信を待たずに描画する
+    renderCached() {
+        const cached = loadCached(this.key);
+        if (cached && cached.data) {
+            this.apply(cached.data);
+            this.entry = cached;
+        }
+    }
+
+    load() {
+        if (!this.loading) {
+            this.loading = this.fetch().finally(() => {
+                this.loading = null;
+            });
+        }
+        return this.loading;
+    }
+
+    async fetch() {
+        const headers = {};
+        if (this.entry && this.entry.etag) {
+            headers['If-None-Match'] = this.entry.etag;
+        }
+        try {
+            const response = await fetch(this.calendar.monthUrl(this.year, this.month), { headers });
+            if (response.status === 304) {
+                return;
+            }
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            const data = await response.json();
+            this.apply(data);
+            this.entry = { etag: response.headers.get('ETag'), data };
+            saveCached(this.key, this.entry);
+        } catch (error) {
+            console.error('カロリーデータの取得中にエラーが発生しました:', error);
+        }
+    }
+
+    // 前回描画した内容と比べ、合計カロリーか目標カロリーが変わった日のセルだけを書き換える
+    apply(data) {
+        const previous = this.entry ? this.entry.data : null;
+        data.totals.forEach((calories, index) => {
+            const cell = this.cells[index];
+            if (!cell) {
+                return;
+            }
+            if (previous && previous.totals[index] === calories && previous.requiredCalories === data.requiredCalories) {
+                return;
+            }
+            cell.classList.toggle('calorie-overage', calories > data.requiredCalories);
+            cell.title = calories ? `${calories} / ${data.requiredCalories} kcal` : '';
+        });
+    }
+}
+
+export class CalorieCalendar {
+    constructor(container) {
+        this.container = container;
+        this.userId = container.dataset.userId;
+        this.enterMealUrl = container.dataset.enterMealUrl;
+        this.monthUrlPattern = container.dataset.monthUrl;
+        this.monthTemplate = document.getElementById(container.dataset.monthTemplate);
+        this.months = [];
+    }
+
+    monthUrl(year, month) {
+        // data-month-url は year=0, month=0 で作った URL
+        return this.monthUrlPattern.replace(/0\/0\/$/, `${year}/${month}/`);
+    }
+
+    render(year) {
+        const fragment = document.createDocumentFragment();
+        for (let month = 1; month <= 12; month++) {
+            const view = new MonthView(this, year, month);
+            view.renderCached();
+            this.months.push(view);
+            fragment.appendChild(view.element);
+        }
+        this.container.replaceChildren(fragment);
+        this.observe();
+
+        // 戻るボタンやタブの切り替えで戻ってきたときは、表示済みの月を確認し直す
+        window.addEventListener('pageshow', event => {
+            if (event.persisted) {
+                this.refresh();
+            }
+        });
+        document.addEventListener('visibilitychange', () => {
+            if (document.visibilityState === 'visible') {
+                this.refresh();
+            }
+        });
+    }
+
+    // 画面に入った月だけを取得する
+    observe() {
+        this.visible = new Set();
+        if (!('IntersectionObserver' in window)) {
+            this.months.forEach(view => {
+                this.visible.add(view);
+                view.load();
+            });
+            return;
+        }
+        const views = new Map(this.months.map(view => [view.element, view]));
+        const observer = new IntersectionObserver(entries => {
+            for (const entry of entries) {
+                const view = views.get(entry.target);
+                if (entry.isIntersecting) {
+                    this.visible.add(view);
+                    view.load();
+                } else {
+                    this.visible.delete(view);
+                }
+            }
+        }, { rootMargin: '200px' });
+        this.months.forEach(view => observer.observe(view.element));
+    }
+
+    refresh() {
+        this.visible.forEach(view => view.load());
+    }
+}
+
+const container = document.getElementById('calendar');
+if (container) {
+    new CalorieCalendar(container).render(new Date().getFullYear());
+}